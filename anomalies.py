@@ -0,0 +1,270 @@
+# Офлайн-поиск аномалий в записанных сессиях: журналы snapshot_log.py и каталоги HTML-снимков.
+# Каждая сессия читается потоком, за один проход отмечается всё сразу, без остановки на первой находке:
+#   overlap     — две фигуры на одной клетке (то самое «клетка уже занята»);
+#   stuck       — позиция не меняется stuck_repeats снимков подряд (как детектор зависания в боте);
+#   repeat      — позиция уже встречалась в сессии раньше;
+#   transition  — соседние позиции не связаны одним-двумя легальными ходами, а для новой задачи отличий слишком мало;
+#   side_to_move — эвристика по last-move не нашла фигуру, противоречит ходам между снимками
+#                  или отдаёт ход стороне, чей соперник под шахом.
+# У каждой находки есть место: файл и номер записи (или путь снимка) и клетка, так что ошибки
+# разбора можно разбирать по тысячам сессий без перезапусков бота.
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from board import Board, Position, SQUARE_NAMES
+from fen_builder import last_move_squares, side_to_move_reason
+from metrics import metrics
+from movegen import in_check, legal_moves
+from snapshot import iter_snapshot_paths, read_snapshot
+from snapshot_log import SnapshotLogReader, encode_pieces
+
+STUCK_REPEATS = 5
+RESET_SQUARES = 8
+
+
+def _anomaly(location, kind, square, message, fen):
+    metrics.incr(f"anomaly_{kind}")
+    return {'location': location, 'kind': kind, 'square': square, 'message': message, 'fen': fen}
+
+
+def plural(count, one, few, many):
+    # Форма слова для числа: 1 клетка, 2 клетки, 5 клеток (11–14 — «много»)
+    if count % 10 == 1 and count % 100 != 11:
+        return one
+    if 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        return few
+    return many
+
+
+def _square_names(squares):
+    return ','.join(SQUARE_NAMES[square] for square in sorted(squares))
+
+
+def iter_log_records(path):
+    # (место, запись) по журналу снимков
+    with SnapshotLogReader(path) as reader:
+        for record in reader:
+            yield f"{path}:{record['index']}", record
+
+
+def iter_html_records(paths, board_width=None):
+    # (место, запись) по HTML-снимкам; запись в том же виде, что у SnapshotLogReader
+    for index, path in enumerate(paths):
+        snapshot = read_snapshot(path, board_width)
+        if snapshot is None:
+            print(f"В {path} не найден cg-board", file=sys.stderr)
+            continue
+        square_size = snapshot['board_width'] / 8
+        yield path, {
+            'index': index,
+            'orientation': snapshot['orientation'],
+            'board_width': snapshot['board_width'],
+            'squares': encode_pieces(snapshot['pieces'], square_size, snapshot['orientation']),
+            'last_squares': last_move_squares(snapshot['last_moves'], square_size, snapshot['orientation']),
+        }
+
+
+def iter_sessions(paths):
+    # Сессия — журнал снимков или каталог HTML-снимков (файлы по порядку имён)
+    html = []
+    for path in paths:
+        if os.path.isfile(path) and not path.endswith(('.html', '.htm')):
+            yield 'log', path
+        else:
+            html.append(path)
+    for directory, group in itertools.groupby(iter_snapshot_paths(html), key=os.path.dirname):
+        yield 'html', list(group)
+
+
+def place_pieces(squares):
+    # Доска и наложения: [(клетка, стоявшая фигура, лишняя фигура)]
+    board = Board()
+    overlaps = []
+    for index, letter in squares:
+        if not board.put(index, letter):
+            overlaps.append((index, board.get(index), letter))
+    return board, overlaps
+
+
+def en_passant(board, last_squares):
+    # Последний ход — двойной ход пешки: поле взятия на проходе, иначе None
+    if len(last_squares) != 2:
+        return None
+    low, high = sorted(last_squares)
+    if high - low != 16:
+        return None
+    # Белая пешка стоит на верхней клетке пары, чёрная — на нижней
+    if board.get(high) == 'P' or board.get(low) == 'p':
+        return low + 8
+    return None
+
+
+def explain(position, squares, max_plies=2):
+    # Ходы, которые ведут из position в расстановку squares, или None
+    frontier = [(position, [])]
+    for _ in range(max_plies):
+        following = []
+        for current, moves in frontier:
+            for move in legal_moves(current):
+                child = current.copy()
+                child.push_uci(move)
+                if child.board.squares == squares:
+                    return child, moves + [move]
+                following.append((child, moves + [move]))
+        frontier = following
+    return None
+
+
+def _flipped(position):
+    return Position(position.board.copy(), 'b' if position.turn == 'w' else 'w', position.castling, None,
+                    position.halfmove, position.fullmove)
+
+
+class SessionAnalyzer:
+    def __init__(self, stuck_repeats=STUCK_REPEATS, reset_squares=RESET_SQUARES):
+        self.stuck_repeats = stuck_repeats
+        self.reset_squares = reset_squares
+        self.previous = None
+        self.previous_location = None
+        self.run = 0
+        self.seen = {}
+
+    def feed(self, location, record):
+        # Отдаёт находки по одной записи
+        board, overlaps = place_pieces(record['squares'])
+        last_squares = record['last_squares']
+        turn, guess = side_to_move_reason(board, last_squares)
+        position = Position(board, turn, board.castling_rights(), en_passant(board, last_squares))
+        fen = position.fen()
+        found = []
+
+        for index, standing, extra in overlaps:
+            found.append(_anomaly(location, 'overlap', SQUARE_NAMES[index],
+                                  f"клетка {SQUARE_NAMES[index]} уже занята {standing}, вторая фигура {extra}", fen))
+        if overlaps:
+            # Кадр анимации: позиция неоднозначна, переходы сверяем со следующим снимком
+            return found
+
+        if guess:
+            found.append(_anomaly(location, 'side_to_move', _square_names(last_squares) or None, guess, fen))
+        if in_check(position, white=turn == 'b'):
+            king = board.squares.find(ord('K' if turn == 'b' else 'k'))
+            found.append(_anomaly(location, 'side_to_move', SQUARE_NAMES[king],
+                                  f"ход {turn}, но под шахом король стороны, которая только что ходила", fen))
+
+        previous = self.previous
+        if previous is not None and previous.board.squares == board.squares:
+            self.run += 1
+            if self.run + 1 == self.stuck_repeats:
+                found.append(_anomaly(location, 'stuck', None,
+                                      f"позиция не меняется {self.stuck_repeats} снимков подряд", fen))
+            self.previous_location = location
+            return found
+        self.run = 0
+
+        key = board.zobrist()
+        if key in self.seen:
+            found.append(_anomaly(location, 'repeat', None, f"позиция уже была в {self.seen[key]}", fen))
+        else:
+            self.seen[key] = location
+
+        if previous is not None:
+            changed = [i for i in range(64) if previous.board.squares[i] != board.squares[i]]
+            if len(changed) <= self.reset_squares:
+                position, found_transition = self._transition(previous, position, changed, location, fen)
+                found += found_transition
+        self.previous = position
+        self.previous_location = location
+        return found
+
+    def _transition(self, previous, position, changed, location, fen):
+        squares = position.board.squares
+        explained = explain(previous, squares)
+        if explained is not None:
+            derived, moves = explained
+            found = []
+            if derived.turn != position.turn:
+                found.append(_anomaly(location, 'side_to_move', None,
+                                      f"по ходам {' '.join(moves)} ход {derived.turn}, эвристика last-move даёт {position.turn}",
+                                      fen))
+            return derived, found
+        explained = explain(_flipped(previous), squares)
+        if explained is not None:
+            derived, moves = explained
+            return derived, [_anomaly(self.previous_location, 'side_to_move', None,
+                                      f"ход был за {'b' if previous.turn == 'w' else 'w'}, а не {previous.turn}: "
+                                      f"дальше сыграно {' '.join(moves)}", previous.fen())]
+        return position, [_anomaly(location, 'transition', _square_names(changed),
+                                   f"{plural(len(changed), 'изменилась', 'изменились', 'изменились')} {len(changed)} "
+                                   f"{plural(len(changed), 'клетка', 'клетки', 'клеток')}, но ни один или два легальных хода "
+                                   f"из {self.previous_location} к этой позиции не ведут", fen)]
+
+
+def analyze(records, stuck_repeats=STUCK_REPEATS, reset_squares=RESET_SQUARES):
+    # records — (место, запись); отдаёт находки по мере чтения
+    analyzer = SessionAnalyzer(stuck_repeats, reset_squares)
+    for location, record in records:
+        yield from analyzer.feed(location, record)
+
+
+def analyze_session(session, stuck_repeats=STUCK_REPEATS, reset_squares=RESET_SQUARES, board_width=None):
+    kind, source = session
+    records = iter_log_records(source) if kind == 'log' else iter_html_records(source, board_width)
+    return analyze(records, stuck_repeats, reset_squares)
+
+
+def _analyze_session_list(session, stuck_repeats, reset_squares, board_width):
+    # Для дочерних процессов: генератор не передать между процессами
+    return list(analyze_session(session, stuck_repeats, reset_squares, board_width))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Аномалии в записанных сессиях: наложения фигур, зависания, "
+                                                 "невозможные переходы и ошибки очереди хода")
+    parser.add_argument('paths', nargs='+', help="Журналы снимков (snapshots.bin), HTML-файлы или каталоги со снимками")
+    parser.add_argument('--stuck-repeats', type=int, default=STUCK_REPEATS,
+                        help="Сколько одинаковых снимков подряд считать зависанием")
+    parser.add_argument('--reset-squares', type=int, default=RESET_SQUARES,
+                        help="Больше изменившихся клеток — новая задача, переход не проверяется")
+    parser.add_argument('--board-width', type=float, default=None,
+                        help="Ширина доски в px для HTML без разметки ширины (по умолчанию 436)")
+    parser.add_argument('--workers', type=int, default=1, help="Процессов для разбора сессий")
+    parser.add_argument('--json', action='store_true', help="Вывод в JSON Lines")
+    args = parser.parse_args(argv)
+
+    t_start = time.time()
+    sessions = iter_sessions(args.paths)
+    options = (args.stuck_repeats, args.reset_squares, args.board_width)
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.workers)
+        results = executor.map(_analyze_session_list, sessions, *(itertools.repeat(option) for option in options))
+    else:
+        executor = None
+        results = (analyze_session(session, *options) for session in sessions)
+
+    counts = {}
+    session_count = 0
+    try:
+        for anomalies in results:
+            session_count += 1
+            for anomaly in anomalies:
+                counts[anomaly['kind']] = counts.get(anomaly['kind'], 0) + 1
+                if args.json:
+                    print(json.dumps(anomaly, ensure_ascii=False))
+                else:
+                    print(f"{anomaly['location']}\t{anomaly['kind']}\t{anomaly['square'] or '-'}\t"
+                          f"{anomaly['message']}\t{anomaly['fen']}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print(f"Сессий: {session_count}, находок: {sum(counts.values())} {counts}, "
+          f"время: {(time.time() - t_start):.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
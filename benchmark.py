@@ -0,0 +1,254 @@
+# Воспроизводимый бенчмарк: разбор снимков в FEN, проверка FEN и время хода движка.
+# Работает по закоммиченному корпусу bench/, без браузера и сети; результат пишется в JSON,
+# чтобы сравнивать прогоны между коммитами и разным числом потоков.
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from board import Position
+from movegen import validate_fen
+from settings import SETTING
+from snapshot import read_snapshot, render_snapshot, snapshot_to_fen
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench')
+ORIENTATIONS = ('white', 'black')
+
+
+def load_positions(path):
+    # Строки корпуса: FEN до хода и ход; снимок — позиция после хода
+    positions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fen, move = line.split('\t')
+            position = Position.from_fen(fen)
+            position.push_uci(move)
+            positions.append({'fen': position.fen(), 'last_move': move})
+    return positions
+
+
+def snapshot_path(corpus, index, orientation):
+    return os.path.join(corpus, 'snapshots', f"{index:03d}-{orientation}.html")
+
+
+def rebuild_corpus(corpus):
+    positions = load_positions(os.path.join(corpus, 'positions.tsv'))
+    os.makedirs(os.path.join(corpus, 'snapshots'), exist_ok=True)
+    for index, position in enumerate(positions):
+        for orientation in ORIENTATIONS:
+            html = render_snapshot(position['fen'], orientation, last_move=position['last_move'])
+            with open(snapshot_path(corpus, index, orientation), 'w', encoding='utf-8', newline='\n') as f:
+                f.write(html)
+    print(f"Корпус пересобран: {len(positions) * len(ORIENTATIONS)} снимков")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples_ns, **extra):
+    values = sorted(samples_ns)
+    total = sum(values)
+    result = {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) / 1e6, 4) if values else None,
+        'p95_ms': round(percentile(values, 95) / 1e6, 4) if values else None,
+        'p99_ms': round(percentile(values, 99) / 1e6, 4) if values else None,
+        'throughput_per_s': round(len(values) / (total / 1e9), 1) if total else None,
+    }
+    result.update(extra)
+    return result
+
+
+def bench_parse(corpus, positions, rounds):
+    samples = []
+    mismatches = 0
+    for _ in range(rounds):
+        for index, position in enumerate(positions):
+            for orientation in ORIENTATIONS:
+                path = snapshot_path(corpus, index, orientation)
+                t_start = time.perf_counter_ns()
+                fen = snapshot_to_fen(read_snapshot(path))
+                samples.append(time.perf_counter_ns() - t_start)
+                # Сверяем расстановку и очередь хода; рокировки и взятие на проходе снимок не хранит
+                if fen.split()[:2] != position['fen'].split()[:2]:
+                    mismatches += 1
+    return summarize(samples, mismatches=mismatches // rounds)
+
+
+def load_pages(corpus):
+    # Сохранённые страницы lichess: имя файла и ожидаемая позиция
+    path = os.path.join(corpus, 'pages', 'expected.tsv')
+    pages = []
+    if not os.path.exists(path):
+        return pages
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            name, fen = line.split('\t')
+            pages.append({'path': os.path.join(corpus, 'pages', name), 'fen': fen})
+    return pages
+
+
+def bench_pages(pages, rounds):
+    # Разбор настоящей разметки: шапка страницы, координаты, move-dest и слои svg вокруг доски
+    samples = []
+    mismatches = 0
+    for _ in range(rounds):
+        for page in pages:
+            t_start = time.perf_counter_ns()
+            fen = snapshot_to_fen(read_snapshot(page['path']))
+            samples.append(time.perf_counter_ns() - t_start)
+            if fen.split()[:2] != page['fen'].split()[:2]:
+                mismatches += 1
+    return summarize(samples, pages=len(pages), mismatches=mismatches // rounds)
+
+
+def _open_engine(threads):
+    from engine_pool import EngineWorker
+    worker = EngineWorker(0, threads, SETTING.hash_size)
+    try:
+        worker.spawn()
+    except Exception as e:
+        print(f"Stockfish недоступен, замеры движка пропущены: {e}", file=sys.stderr)
+        return None
+    return worker
+
+
+def bench_validate(positions, rounds):
+    samples = []
+    for _ in range(rounds):
+        for position in positions:
+            t_start = time.perf_counter_ns()
+            ok, reason = validate_fen(position['fen'])
+            samples.append(time.perf_counter_ns() - t_start)
+            if not ok:
+                print(f"Позиция корпуса не прошла проверку: {position['fen']} ({reason})", file=sys.stderr)
+    return summarize(samples)
+
+
+def bench_planes(positions, rounds, total=4096, batch_size=256):
+    # Пакетное кодирование в плоскости: один замер на пачку, нормированный на позицию,
+    # так что перцентили — по разбросу между пачками, а throughput — позиций в секунду
+    try:
+        from planes import allocate, encode_batch
+    except ImportError:
+        print("NumPy не установлен, замер кодирования в плоскости пропущен", file=sys.stderr)
+        return None
+    fens = [position['fen'] for position in positions]
+    fens = (fens * (total // len(fens) + 1))[:total]
+    batches = [fens[start:start + batch_size] for start in range(0, total, batch_size)]
+    out = allocate(batch_size)
+    samples = []
+    for _ in range(rounds):
+        for batch in batches:
+            t_start = time.perf_counter_ns()
+            encode_batch(batch, out)
+            samples.append((time.perf_counter_ns() - t_start) / len(batch))
+    return summarize(samples, batch_size=batch_size)
+
+
+def bench_engine(worker, positions, think_time=None, depth=None):
+    samples = []
+    for position in positions:
+        # set_fen_position отправляет ucinewgame, так что каждая позиция считается с чистой хеш-таблицей
+        t_start = time.perf_counter_ns()
+        worker.analyse(position['fen'], think_time, depth)
+        samples.append(time.perf_counter_ns() - t_start)
+    return summarize(samples, think_time=think_time, depth=depth)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    positions = load_positions(os.path.join(args.corpus, 'positions.tsv'))
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'threads': args.threads,
+            'positions': len(positions),
+        },
+        'results': {},
+    }
+    results = report['results']
+
+    results['snapshot_to_fen'] = bench_parse(args.corpus, positions, args.rounds)
+    print(f"snapshot_to_fen: {results['snapshot_to_fen']}")
+    pages = load_pages(args.corpus)
+    if pages:
+        results['page_to_fen'] = bench_pages(pages, args.rounds)
+        print(f"page_to_fen: {results['page_to_fen']}")
+    results['fen_validation'] = bench_validate(positions, args.rounds)
+    print(f"fen_validation: {results['fen_validation']}")
+    planes = bench_planes(positions, args.rounds)
+    if planes is not None:
+        results['plane_encoding'] = planes
+        print(f"plane_encoding: {planes}")
+
+    if not args.no_engine:
+        worker = _open_engine(args.threads)
+        if worker is not None:
+            try:
+                for think_time in args.think_times:
+                    key = f"engine_time_{think_time}ms"
+                    results[key] = bench_engine(worker, positions, think_time=think_time)
+                    print(f"{key}: {results[key]}")
+                for depth in args.depths:
+                    key = f"engine_depth_{depth}"
+                    results[key] = bench_engine(worker, positions, depth=depth)
+                    print(f"{key}: {results[key]}")
+            finally:
+                worker.close()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+    return report
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора снимков и задержки Stockfish")
+    parser.add_argument('--corpus', default=BENCH_DIR, help="Каталог корпуса (positions.tsv, snapshots/ и pages/)")
+    parser.add_argument('--output', default='bench_results.json', help="Куда записать JSON с результатами")
+    parser.add_argument('--rounds', type=int, default=50, help="Повторов разбора корпуса")
+    parser.add_argument('--threads', type=int, default=SETTING.threads, help="Потоков Stockfish")
+    parser.add_argument('--think-times', type=_int_list, default=[100, 300, SETTING.thinking_time],
+                        help="Время на ход через запятую, мс")
+    parser.add_argument('--depths', type=_int_list, default=[8, 12, 16], help="Глубины через запятую")
+    parser.add_argument('--no-engine', action='store_true', help="Только разбор снимков, без Stockfish")
+    parser.add_argument('--rebuild-corpus', action='store_true', help="Пересобрать snapshots/ из positions.tsv")
+    args = parser.parse_args(argv)
+
+    if args.rebuild_corpus:
+        rebuild_corpus(args.corpus)
+        return
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+# Компактная доска: 64 байта, индекс клетки = ранг * 8 + вертикаль (a1 = 0, h8 = 63).
+# Одна доска используется парсером, определением рокировки и логикой last-move.
+import functools
+import random
+
+FILES = 'abcdefgh'
+SQUARE_NAMES = [f"{f}{r}" for r in '12345678' for f in FILES]
+SQUARE_INDEX = {name: index for index, name in enumerate(SQUARE_NAMES)}
+
+EMPTY = 0
+PIECES = 'KQRBNPkqrbnp'
+
+# Кэш закодированных горизонталей: в партиях и задачах их набор сильно повторяется,
+# но на корпусе из миллионов позиций различных горизонталей много — размер ограничен
+RANK_CACHE_SIZE = 1 << 14
+
+# Ключи Zobrist (64 бита). Генератор с фиксированным зерном: хеши попадают в индексы на диске
+# и должны совпадать между запусками и версиями — зерно и порядок генерации не менять
+_ZOBRIST_RANDOM = random.Random(0x5EED_C4E5)
+# ZOBRIST_PIECES[код фигуры][клетка]; для пустой клетки и прочих кодов — нули
+ZOBRIST_PIECES = [[0] * 64 for _ in range(128)]
+for _piece in PIECES:
+    ZOBRIST_PIECES[ord(_piece)] = [_ZOBRIST_RANDOM.getrandbits(64) for _ in range(64)]
+ZOBRIST_CASTLING = {right: _ZOBRIST_RANDOM.getrandbits(64) for right in 'KQkq'}
+ZOBRIST_EP = [_ZOBRIST_RANDOM.getrandbits(64) for _ in range(8)]
+ZOBRIST_BLACK = _ZOBRIST_RANDOM.getrandbits(64)
+
+
+def fen_zobrist(fen):
+    # Хеш позиции прямо по строке FEN, без построения Position; совпадает с Position.zobrist
+    fields = fen.split()
+    result = 0
+    for i, row in enumerate(fields[0].split('/')):
+        index = (7 - i) * 8
+        for char in row:
+            if char.isdigit():
+                index += int(char)
+            else:
+                result ^= ZOBRIST_PIECES[ord(char)][index]
+                index += 1
+    if len(fields) > 1 and fields[1] == 'b':
+        result ^= ZOBRIST_BLACK
+    if len(fields) > 2:
+        for right in fields[2]:
+            result ^= ZOBRIST_CASTLING.get(right, 0)
+    if len(fields) > 3 and fields[3] in SQUARE_INDEX:
+        result ^= ZOBRIST_EP[SQUARE_INDEX[fields[3]] % 8]
+    return result
+
+
+def square_name(index):
+    return SQUARE_NAMES[index]
+
+
+def square_index(name):
+    return SQUARE_INDEX.get(name)
+
+
+@functools.lru_cache(maxsize=RANK_CACHE_SIZE)
+def _encode_rank(rank_bytes):
+    fen_row = ''
+    empty = 0
+    for code in rank_bytes:
+        if code == EMPTY:
+            empty += 1
+        else:
+            if empty > 0:
+                fen_row += str(empty)
+                empty = 0
+            fen_row += chr(code)
+    if empty > 0:
+        fen_row += str(empty)
+    return fen_row
+
+
+class Board:
+    __slots__ = ('squares',)
+
+    def __init__(self, squares=None):
+        self.squares = bytearray(squares) if squares is not None else bytearray(64)
+
+    @classmethod
+    def from_placement(cls, placement):
+        board = cls()
+        squares = board.squares
+        for i, row in enumerate(placement.split('/')):
+            index = (7 - i) * 8
+            for char in row:
+                if char.isdigit():
+                    index += int(char)
+                else:
+                    squares[index] = ord(char)
+                    index += 1
+        return board
+
+    def copy(self):
+        return Board(self.squares)
+
+    def get(self, index):
+        code = self.squares[index]
+        return chr(code) if code else None
+
+    def put(self, index, piece):
+        # Не перезаписываем занятую клетку — вызывающий решает, что делать с конфликтом
+        if self.squares[index] != EMPTY:
+            return False
+        self.squares[index] = ord(piece)
+        return True
+
+    def set(self, index, piece):
+        self.squares[index] = ord(piece) if piece else EMPTY
+
+    def placement(self):
+        squares = self.squares
+        return '/'.join(_encode_rank(bytes(squares[rank * 8:rank * 8 + 8])) for rank in range(7, -1, -1))
+
+    def zobrist(self):
+        # Хеш одной расстановки, без очереди хода и рокировок
+        result = 0
+        for index, code in enumerate(self.squares):
+            if code:
+                result ^= ZOBRIST_PIECES[code][index]
+        return result
+
+    def castling_rights(self):
+        squares = self.squares
+        result = ''
+        if squares[4] == ord('K'):
+            if squares[7] == ord('R'): result += 'K'
+            if squares[0] == ord('R'): result += 'Q'
+        if squares[60] == ord('k'):
+            if squares[63] == ord('r'): result += 'k'
+            if squares[56] == ord('r'): result += 'q'
+        return result if result else '-'
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.squares == other.squares
+
+    def __repr__(self):
+        return f"Board('{self.placement()}')"
+
+
+# Угловые клетки ладей: ход с них или взятие на них снимает соответствующую рокировку
+_CASTLING_SQUARES = {0: 'Q', 7: 'K', 56: 'q', 63: 'k'}
+
+
+class Position:
+    # Полное состояние FEN поверх Board: очередь хода, рокировки, взятие на проходе и счётчики
+    __slots__ = ('board', 'turn', 'castling', 'ep', 'halfmove', 'fullmove', 'zobrist')
+
+    def __init__(self, board=None, turn='w', castling='-', ep=None, halfmove=0, fullmove=1, zobrist=None):
+        self.board = board if board is not None else Board()
+        self.turn = turn
+        self.castling = castling
+        self.ep = ep
+        self.halfmove = halfmove
+        self.fullmove = fullmove
+        # Хеш тех же полей, что и key(); push_uci обновляет его по изменившимся клеткам
+        self.zobrist = zobrist if zobrist is not None else self.compute_zobrist()
+
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        placement = fields[0]
+        turn = fields[1] if len(fields) > 1 else 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        ep = SQUARE_INDEX.get(fields[3]) if len(fields) > 3 else None
+        halfmove = int(fields[4]) if len(fields) > 4 else 0
+        fullmove = int(fields[5]) if len(fields) > 5 else 1
+        return cls(Board.from_placement(placement), turn, castling, ep, halfmove, fullmove)
+
+    def copy(self):
+        return Position(self.board.copy(), self.turn, self.castling, self.ep, self.halfmove, self.fullmove,
+                        self.zobrist)
+
+    def compute_zobrist(self):
+        result = self.board.zobrist()
+        if self.turn == 'b':
+            result ^= ZOBRIST_BLACK
+        for right in self.castling:
+            result ^= ZOBRIST_CASTLING.get(right, 0)
+        if self.ep is not None:
+            result ^= ZOBRIST_EP[self.ep % 8]
+        return result
+
+    def fen(self):
+        ep = SQUARE_NAMES[self.ep] if self.ep is not None else '-'
+        return f"{self.board.placement()} {self.turn} {self.castling} {ep} {self.halfmove} {self.fullmove}"
+
+    def key(self):
+        # FEN без счётчиков ходов — одна и та же позиция при любых номерах хода
+        ep = SQUARE_NAMES[self.ep] if self.ep is not None else '-'
+        return f"{self.board.placement()} {self.turn} {self.castling} {ep}"
+
+    def _drop_castling(self, rights):
+        castling = ''.join(c for c in self.castling if c not in rights)
+        self.castling = castling if castling else '-'
+
+    def push_uci(self, move):
+        # Возвращает клетки, которые затронул ход, — по ним трекер сверяет позицию со снимком
+        squares = self.board.squares
+        source = SQUARE_INDEX[move[:2]]
+        target = SQUARE_INDEX[move[2:4]]
+        code = squares[source]
+        if code == EMPTY:
+            raise ValueError(f"На {move[:2]} нет фигуры для хода {move}")
+        before = bytes(squares)
+        castling_before = self.castling
+        ep_before = self.ep
+        piece = chr(code)
+        captured = squares[target]
+        kind = piece.lower()
+        white = piece.isupper()
+
+        touched = [source, target]
+        squares[source] = EMPTY
+        if len(move) == 5:
+            piece = move[4].upper() if white else move[4].lower()
+        squares[target] = ord(piece)
+
+        if kind == 'p' and captured == EMPTY and (target - source) % 8:
+            # Пешка ушла по диагонали на пустую клетку — взятие на проходе, побитая пешка стоит позади
+            victim = target - 8 if white else target + 8
+            squares[victim] = EMPTY
+            touched.append(victim)
+            captured = ord('p' if white else 'P')
+        if kind == 'k' and abs(target - source) == 2:
+            rook_from, rook_to = (source + 3, source + 1) if target > source else (source - 4, source - 1)
+            squares[rook_to] = squares[rook_from]
+            squares[rook_from] = EMPTY
+            touched += (rook_from, rook_to)
+
+        self.ep = None
+        if kind == 'p' and abs(target - source) == 16:
+            # Ставим поле взятия на проходе, только если рядом есть пешка соперника, которая может взять
+            enemy = ord('p' if white else 'P')
+            file = target % 8
+            if (file > 0 and squares[target - 1] == enemy) or (file < 7 and squares[target + 1] == enemy):
+                self.ep = (source + target) // 2
+
+        if self.castling != '-':
+            if kind == 'k':
+                self._drop_castling('KQ' if white else 'kq')
+            for square in (source, target):
+                rights = _CASTLING_SQUARES.get(square)
+                if rights:
+                    self._drop_castling(rights)
+
+        self.halfmove = 0 if kind == 'p' or captured != EMPTY else self.halfmove + 1
+        if not white:
+            self.fullmove += 1
+        self.turn = 'b' if white else 'w'
+
+        zobrist = self.zobrist ^ ZOBRIST_BLACK
+        for square in touched:
+            zobrist ^= ZOBRIST_PIECES[before[square]][square] ^ ZOBRIST_PIECES[squares[square]][square]
+        if castling_before != self.castling:
+            for right in castling_before:
+                zobrist ^= ZOBRIST_CASTLING.get(right, 0)
+            for right in self.castling:
+                zobrist ^= ZOBRIST_CASTLING.get(right, 0)
+        if ep_before is not None:
+            zobrist ^= ZOBRIST_EP[ep_before % 8]
+        if self.ep is not None:
+            zobrist ^= ZOBRIST_EP[self.ep % 8]
+        self.zobrist = zobrist
+        return touched
+
@@ -0,0 +1,26 @@
+# Чекпоинты долгих офлайн-прогонов: JSON-состояние, запись через временный файл,
+# чтобы прерванная запись не испортила предыдущий чекпоинт.
+import json
+import os
+
+
+def load_checkpoint(path, default):
+    if not path or not os.path.exists(path):
+        return dict(default)
+    with open(path, 'r', encoding='utf-8') as f:
+        state = dict(default)
+        state.update(json.load(f))
+        return state
+
+
+def save_checkpoint(path, state):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def truncate_output(path, size):
+    # Отрезаем строки, записанные после последнего чекпоинта
+    with open(path, 'ab') as out:
+        out.truncate(size)
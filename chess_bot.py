@@ -1,14 +1,16 @@
 import asyncio
 import random
 import time
-from playwright.async_api import async_playwright
-from stockfish import Stockfish
-
-class SETTING:
-    thinking_time = 900
-    threads = 8 # Количество задействованных ядер Stockfish'ом
-    puzzle_mode = True
-    depth = None # Можно задать глубину
+from board import SQUARE_INDEX
+from engine_pool import EnginePool
+from fen_builder import coords_to_square, detect_castling_rights, transform_table
+from metrics import metrics
+from move_cache import MoveCache
+from movegen import validate_fen
+from settings import SETTING
+from snapshot_log import SnapshotLog
+from tablebase import open_tablebase
+from tracker import PositionTracker
 
 class Parser:
     def __init__(self):
@@ -37,6 +39,7 @@ class Parser:
     async def setup_browser(self):
         if self.browser:
             await self.browser.close()
+        from playwright.async_api import async_playwright
         self.playwright = await async_playwright().start()
         self.browser = await self.playwright.chromium.launch(
             headless=False,
@@ -81,70 +84,37 @@ class Parser:
 class Chess(Parser):
     def __init__(self):
         super().__init__()
-        self.stockfish = Stockfish(path="C:/Program Files (x86)/stockfish/stockfish.exe")
+        self.engines = EnginePool(size=1, cache=MoveCache(SETTING.cache_path, SETTING.cache_size),
+                                  tablebase=open_tablebase(SETTING.syzygy_path))
         self.board_state = None
         self.square_size = None
         self.board_width = None
         self.orientation = None
         self.board_rect = None
+        self.tracker = PositionTracker()
+        self.snapshot_log = SnapshotLog(SETTING.snapshot_log) if SETTING.snapshot_log else None
+        self.last_logged = None
 
     def initialize_stockfish(self):
-        self.stockfish.set_skill_level(20)
-        self.stockfish.set_depth(SETTING.depth)
+        self.engines.start()
 
     def _coords_to_square(self, x, y, square_size, orientation='white'):
-        try:
-            x, y = float(x), float(y)
-            if orientation == 'black':
-                col = min(max(7 - int(x // square_size), 0), 7)
-                row = min(max(7 - int(y // square_size), 0), 7)
-            else:
-                col = min(max(int(x // square_size), 0), 7)
-                row = min(max(7 - int(y // square_size), 0), 7)
-            files = 'abcdefgh'
-            square = f"{files[col]}{row + 1}"
-            return square
-        except Exception as e:
-            print(f"Ошибка преобразования координат: x={x}, y={y}, ошибка: {e}")
-            return None
+        return coords_to_square(x, y, square_size, orientation)
 
     def _square_to_coords(self, square):
         try:
-            col = ord(square[0]) - ord('a')
-            row = int(square[1]) - 1
-            if self.orientation == 'white':
-                x = col * self.square_size
-                y = (7 - row) * self.square_size
-            else:
-                x = (7 - col) * self.square_size
-                y = row * self.square_size
-            x += self.square_size / 2
-            y += self.square_size / 2
-            return {'x': x, 'y': y}
+            center = transform_table(self.square_size, self.orientation).center(SQUARE_INDEX[square])
+            return dict(center)
         except Exception as e:
             print(f"Ошибка преобразования клетки {square} в координаты: {e}")
             return None
 
     def _detect_castling_rights(self, board):
-        result = ''
-        if board[0][4] == 'K':
-            if board[0][7] == 'R': result += 'K'
-            if board[0][0] == 'R': result += 'Q'
-        if board[7][4] == 'k':
-            if board[7][7] == 'r': result += 'k'
-            if board[7][0] == 'r': result += 'q'
-        return result if result else '-'
+        return detect_castling_rights(board)
 
     async def _parse_board_to_fen(self):
         try:
-            t_start = time.time()
-            board = [[' ' for _ in range(8)] for _ in range(8)]
-            piece_map = {
-                'white king': 'K', 'white queen': 'Q', 'white rook': 'R', 'white bishop': 'B',
-                'white knight': 'N', 'white pawn': 'P',
-                'black king': 'k', 'black queen': 'q', 'black rook': 'r', 'black bishop': 'b',
-                'black knight': 'n', 'black pawn': 'p'
-            }
+            t_start = time.perf_counter_ns()
 
             if self.orientation is None or SETTING.puzzle_mode:
                 orientation = await self.page.evaluate('''() => {
@@ -173,134 +143,17 @@ class Chess(Parser):
                 return Array.from(document.querySelectorAll('cg-board square.last-move')).map(s => s.style.transform);
             }''')
 
-            for piece in pieces:
-                if 'ghost' in piece['class']:
-                    continue
-                class_name = piece['class'].replace(' dragging', '').replace(' ghost', '')
-                if not piece['transform'] or 'translate' not in piece['transform']:
-                    continue
-                coords = piece['transform'].split('(')[1].split(')')[0].split(',')
-                x = float(coords[0].replace('px', '').strip())
-                y = float(coords[1].replace('px', '').strip())
-                square = self._coords_to_square(x, y, self.square_size, self.orientation)
-                if not square:
-                    continue
-                col = ord(square[0]) - ord('a')
-                row = int(square[1]) - 1
-                if class_name in piece_map:
-                    if board[row][col] != ' ':
-                        print(f"❗ Клетка {square} уже занята {board[row][col]}, не перезаписываем {piece_map[class_name]}")
-                        continue
-                    board[row][col] = piece_map[class_name]
-
-            fen_rows = []
-            if self.orientation == 'black':
-                for row in range(8):
-                    empty = 0
-                    fen_row = ''
-                    for col in range(8):
-                        piece = board[row][col]
-                        if piece == ' ':
-                            empty += 1
-                        else:
-                            if empty > 0:
-                                fen_row += str(empty)
-                                empty = 0
-                            fen_row += piece
-                    if empty > 0:
-                        fen_row += str(empty)
-                    fen_rows.append(fen_row)
-            else:
-                for row in range(7, -1, -1):
-                    empty = 0
-                    fen_row = ''
-                    for col in range(8):
-                        piece = board[row][col]
-                        if piece == ' ':
-                            empty += 1
-                        else:
-                            if empty > 0:
-                                fen_row += str(empty)
-                                empty = 0
-                            fen_row += piece
-                    if empty > 0:
-                        fen_row += str(empty)
-                    fen_rows.append(fen_row)
-            piece_placement = '/'.join(fen_rows)
-
-            my_color = 'w' if self.orientation == 'white' else 'b'
-            active_color = 'w'
-            if last_moves:
-                print(f"Обнаружены last-move: {len(last_moves)} клеток\n", last_moves)
-                found_exact = False
-
-                # Сначала пытаемся найти фигуру точно на одной из last-move клеток
-                for transform in last_moves:
-                    if 'translate' not in transform:
-                        continue
-                    coords = transform.split('(')[1].split(')')[0].split(',')
-                    x = float(coords[0].replace('px', '').strip())
-                    y = float(coords[1].replace('px', '').strip())
-                    square = self._coords_to_square(x, y, self.square_size, self.orientation)
-                    print(f"Last-move клетка: {square} (x={x}, y={y})")
-
-                    for piece in pieces:
-                        if 'transform' not in piece or 'translate' not in piece['transform']:
-                            continue
-                        piece_x = float(piece['transform'].split('(')[1].split(')')[0].split(',')[0].replace('px', '').strip())
-                        piece_y = float(piece['transform'].split('(')[1].split(')')[0].split(',')[1].replace('px', '').strip())
-                        if abs(piece_x - x) < 0.1 and abs(piece_y - y) < 0.1:
-                            class_name = piece['class'].replace(' dragging', '').replace(' ghost', '')
-                            print(f"Фигура на last-move: {class_name}")
-                            if 'white' in class_name:
-                                active_color = 'b'
-                            elif 'black' in class_name:
-                                active_color = 'w'
-                            found_exact = True
-                            break
-                    if found_exact:
-                        break
-
-                # Если точная фигура не найдена — ищем ближайшую к любой клетке. Это значит была рокировка и фигур нету на пунктах назначения. 
-                # Например Ke1=>Kg1 Rh8=>Rf1, клетки в last move будет e1 и h8, но фигур там уже не будет
-                if not found_exact:
-                    print("Фигура на last-move не найдена, ищем ближайшие фигуры")
-                    for transform in last_moves:
-                        if 'translate' not in transform:
-                            continue
-                        coords = transform.split('(')[1].split(')')[0].split(',')
-                        x = float(coords[0].replace('px', '').strip())
-                        y = float(coords[1].replace('px', '').strip())
-                        square = self._coords_to_square(x, y, self.square_size, self.orientation)
-
-                        for piece in pieces:
-                            if 'transform' not in piece or 'translate' not in piece['transform']:
-                                continue
-                            piece_x = float(piece['transform'].split('(')[1].split(')')[0].split(',')[0].replace('px', '').strip())
-                            piece_y = float(piece['transform'].split('(')[1].split(')')[0].split(',')[1].replace('px', '').strip())
-                            if abs(piece_x - x) <= 2 * self.square_size and abs(piece_y - y) <= 2 * self.square_size:
-                                class_name = piece['class'].replace(' dragging', '').replace(' ghost', '')
-                                piece_square = self._coords_to_square(piece_x, piece_y, self.square_size, self.orientation)
-                                print(f"Найдена ближайшая фигура: {class_name} на {piece_square} (x={piece_x}, y={piece_y})")
-                                if 'white' in class_name:
-                                    active_color = 'b'
-                                elif 'black' in class_name:
-                                    active_color = 'w'
-                                found_exact = True
-                                break
-                        if found_exact:
-                            break
-
-                if not found_exact:
-                    print("Фигура на last-move и ближайшие не найдены, используем цвет по умолчанию: w")
-
-            castling = self._detect_castling_rights(board)
-            en_passant = '-'
-            halfmove = '0'
-            fullmove = '1'
-
-            fen = f"{piece_placement} {active_color} {castling} {en_passant} {halfmove} {fullmove}"
-            print(f"Сформирован FEN: {fen}, время: {(time.time() - t_start):.3f}s")
+            if self.snapshot_log is not None:
+                # Повторные одинаковые снимки (ожидание соперника, зависание) пишем один раз
+                snapshot_key = (tuple((p['class'], p['transform']) for p in pieces), tuple(last_moves))
+                if snapshot_key != self.last_logged:
+                    self.snapshot_log.append_pieces(pieces, last_moves, self.board_width, self.orientation)
+                    self.last_logged = snapshot_key
+
+            # Трекер применяет только разницу с прошлым снимком, полный разбор — лишь при рассинхронизации
+            fen = self.tracker.update(pieces, last_moves, self.square_size, self.orientation, verbose=True)
+            metrics.observe('page_parse', time.perf_counter_ns() - t_start)
+            print(f"Сформирован FEN: {fen}")
             return fen
         except Exception as e:
             print(f"Ошибка парсинга FEN: {e}")
@@ -309,7 +162,7 @@ class Chess(Parser):
 
     async def get_board_position(self):
         try:
-            t_start = time.time()
+            t_start = time.perf_counter_ns()
             if not self.page or self.page.is_closed():
                 print("Страница закрыта, невозможно получить позицию")
                 return None
@@ -317,7 +170,7 @@ class Chess(Parser):
             fen = await self._parse_board_to_fen()
             if fen:
                 self.board_state = fen
-                print(f"Текущая позиция (FEN): {fen}, время: {(time.time() - t_start):.3f}s")
+                metrics.observe('get_position', time.perf_counter_ns() - t_start)
             return fen
         except Exception as e:
             print(f"Ошибка получения позиции: {e}")
@@ -325,13 +178,14 @@ class Chess(Parser):
 
     async def get_best_move(self, fen, think_time=30):
         try:
-            t_start = time.time()
-            if not self.stockfish.is_fen_valid(fen):
-                print(f"Некорректный FEN: {fen}")
+            t_start = time.perf_counter_ns()
+            ok, reason = validate_fen(fen)
+            if not ok:
+                print(f"Некорректный FEN: {fen} ({reason})")
                 return None
-            self.stockfish.set_fen_position(fen)
-            best_move = self.stockfish.get_best_move_time(think_time)
-            print(f"Лучший ход от Stockfish: {best_move}, время: {(time.time() - t_start):.3f}s")
+            best_move = (await self.engines.analyse(fen, think_time))['move']
+            metrics.observe('best_move', time.perf_counter_ns() - t_start)
+            print(f"Лучший ход от Stockfish: {best_move}")
             return best_move
         except Exception as e:
             print(f"Ошибка получения хода от Stockfish: {e}")
@@ -339,7 +193,7 @@ class Chess(Parser):
 
     async def make_move(self, move):
         try:
-            t_start = time.time()
+            t_start = time.perf_counter_ns()
             if not move:
                 print("Ход не определён (move is None)")
                 return False
@@ -376,7 +230,8 @@ class Chess(Parser):
                 await self.page.mouse.down()
                 await self.page.mouse.move(target_x, target_y, steps=5)
                 await self.page.mouse.up()
-                print(f"Выполнен ход: {move}, время: {(time.time() - t_start):.3f}s")
+                metrics.observe('make_move', time.perf_counter_ns() - t_start)
+                print(f"Выполнен ход: {move}")
                 return True
             else:
                 print(f"Не удалось вычислить координаты: source={source_coords}, target={target_coords}")
@@ -387,11 +242,10 @@ class Chess(Parser):
 
     async def is_my_turn(self, fen):
         try:
-            t_start = time.time()
             active_color = fen.split(' ')[1]
             my_color = 'w' if self.orientation == 'white' else 'b'
             is_my_turn = active_color == my_color
-            print(f"Проверка хода: активный цвет={active_color}, мой цвет={my_color}, мой ход={is_my_turn}, время: {(time.time() - t_start):.3f}s")
+            print(f"Проверка хода: активный цвет={active_color}, мой цвет={my_color}, мой ход={is_my_turn}")
             return is_my_turn
         except Exception as e:
             print(f"Ошибка проверки хода: {e}")
@@ -399,7 +253,7 @@ class Chess(Parser):
 
     async def wait_for_opponent(self):
         try:
-            t_start = time.time()
+            t_start = time.perf_counter_ns()
             current_fen = await self.get_board_position()
             if not current_fen:
                 print("Не удалось получить начальную позицию")
@@ -414,7 +268,8 @@ class Chess(Parser):
                     print("Не удалось получить новую позицию")
                     return False
                 if new_fen != current_fen:
-                    print(f"Ход противника обнаружен, время: {(time.time() - t_start):.3f}s")
+                    metrics.observe('wait_for_opponent', time.perf_counter_ns() - t_start)
+                    print("Ход противника обнаружен")
                     if await self.is_my_turn(new_fen):
                         return True
                 await asyncio.sleep(0.1)
@@ -450,11 +305,6 @@ class Chess(Parser):
             await self.setup_browser()
             self.initialize_stockfish()
 
-            self.stockfish.update_engine_parameters({
-                "Threads": SETTING.threads,
-                "Hash": 128
-            })
-
             await self.page.goto("https://lichess.org/storm", wait_until="domcontentloaded")
             await self.emulate_human_behavior()
 
@@ -462,7 +312,7 @@ class Chess(Parser):
             last_fen = None
 
             while True:
-                t_start = time.time()
+                t_start = time.perf_counter_ns()
                 if not self.page or self.page.is_closed():
                     print("Страница закрыта, завершаем")
                     break
@@ -474,40 +324,41 @@ class Chess(Parser):
 
                 if fen == last_fen:
                     same_fen_count += 1
+                    metrics.incr('same_fen_repeats')
                 else:
                     same_fen_count = 0
                     last_fen = fen
 
                 if same_fen_count >= 5:
                     print("FEN не меняется 5 итераций — сохраняем и рестартим.")
+                    metrics.incr('stuck_positions')
                     with open("failed_fen.txt", "w", encoding="utf-8") as f:
                         f.write(fen)
+                    if self.snapshot_log is not None and self.snapshot_log.records:
+                        print(f"Снимок позиции: {SETTING.snapshot_log}, запись {self.snapshot_log.records - 1}")
                     html_content = await self.page.content()
                     with open("failed_position.html", "w", encoding="utf-8") as f:
                         f.write(html_content)
                     return
 
                 print(f"Решаем задачу, FEN: {fen}")
-                if not self.stockfish.is_fen_valid(fen):
-                    print(f"Некорректный FEN: {fen} — сохраняем и выходим.")
+                ok, reason = validate_fen(fen)
+                if not ok:
+                    print(f"Некорректный FEN: {fen} ({reason}) — сохраняем и выходим.")
+                    metrics.incr('invalid_fens')
                     with open("failed_fen.txt", "w", encoding="utf-8") as f:
                         f.write(fen)
+                    if self.snapshot_log is not None and self.snapshot_log.records:
+                        print(f"Снимок позиции: {SETTING.snapshot_log}, запись {self.snapshot_log.records - 1}")
                     html_content = await self.page.content()
                     with open("failed_position.html", "w", encoding="utf-8") as f:
                         f.write(html_content)
                     break
 
-                try:
-                    self.stockfish.set_fen_position(fen)
-                    best_move = self.stockfish.get_best_move_time(SETTING.thinking_time)
-                    print(f"Лучший ход от Stockfish: {best_move}")
-                except Exception as e:
-                    print(f"Stockfish крэшнулся: {e}")
-                    try:
-                        self.stockfish = Stockfish(path="C:/Program Files (x86)/stockfish/stockfish.exe")
-                        self.initialize_stockfish()
-                    except Exception as inner:
-                        print(f"Не удалось пересоздать движок: {inner}")
+                # Упавший движок пул пересоздаёт сам, здесь достаточно пропустить итерацию
+                best_move = (await self.engines.analyse(fen, SETTING.thinking_time))['move']
+                print(f"Лучший ход от Stockfish: {best_move}")
+                if not best_move:
                     continue
 
 
@@ -548,7 +399,8 @@ class Chess(Parser):
                 await self.page.evaluate("window.__lastPieceCount = document.querySelectorAll('cg-board piece').length")
 
                 self.orientation = None
-                print(f"Общее время хода: {(time.time() - t_start):.3f}s")
+                metrics.observe('move_total', time.perf_counter_ns() - t_start)
+                metrics.incr('moves')
                 await asyncio.sleep(0.1) 
 
         except Exception as e:
@@ -557,6 +409,12 @@ class Chess(Parser):
             print("Закрываемся")
             await asyncio.sleep(300)
             await self.close()
+            self.engines.close()
+            if self.snapshot_log is not None:
+                self.snapshot_log.close()
+            if metrics.enabled and SETTING.metrics_path:
+                metrics.export(SETTING.metrics_path)
+                print(f"Метрики сохранены в {SETTING.metrics_path}")
 
 
 
@@ -0,0 +1,133 @@
+# Пакетная конвертация каталогов сохранённых снимков доски в корпус FEN.
+# Разбор раскидывается по процессам (ProcessPoolExecutor) пачками файлов,
+# результаты пишутся на диск сразу и в исходном порядке обхода, одинаковые позиции
+# отбрасываются по хешу Zobrist через индекс на диске (position_index.py, <корпус>.idx),
+# так что множество уже записанных FEN не строится в памяти. После каждой пачки — чекпоинт, прерванный прогон продолжается с того же файла.
+import argparse
+import itertools
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from board import fen_zobrist
+from checkpoint import load_checkpoint, save_checkpoint, truncate_output
+from position_index import find, open_index
+from snapshot import iter_snapshot_paths, read_snapshot, snapshot_to_fen
+
+CHECKPOINT_DEFAULT = {'done': 0, 'output_size': 0, 'last_path': None, 'written': 0, 'duplicates': 0, 'errors': 0}
+
+
+def convert_batch(paths, board_width=None):
+    # Выполняется в дочернем процессе: [(fen или None, хеш или None, ошибка или None)] в порядке paths
+    results = []
+    for path in paths:
+        try:
+            snapshot = read_snapshot(path, board_width)
+            if snapshot is None:
+                results.append((None, None, "не найден cg-board"))
+            else:
+                fen = snapshot_to_fen(snapshot)
+                results.append((fen, fen_zobrist(fen), None))
+        except Exception as e:
+            results.append((None, None, str(e)))
+    return results
+
+
+def iter_batches(paths, size):
+    paths = iter(paths)
+    while True:
+        batch = list(itertools.islice(paths, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_converted(executor, paths, board_width=None, batch_size=64, window=16):
+    # Отдаёт (пачка путей, результаты) строго по порядку; в работе не больше window пачек,
+    # так что обход дерева на сотни тысяч файлов не попадает в память целиком
+    pending = deque()
+    for batch in iter_batches(paths, batch_size):
+        pending.append((batch, executor.submit(convert_batch, batch, board_width)))
+        if len(pending) >= window:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+    while pending:
+        batch, future = pending.popleft()
+        yield batch, future.result()
+
+
+def run(args):
+    state = load_checkpoint(args.checkpoint, CHECKPOINT_DEFAULT)
+    paths = iter_snapshot_paths(args.paths)
+    if state['done']:
+        # Пропускаем обработанные файлы счётом, не держа их пути в памяти; сверяем только последний.
+        # Проверка до обрезки корпуса и открытия индекса: при отказе ничего не трогаем
+        last = next(itertools.islice(paths, state['done'] - 1, None), None)
+        if last != state['last_path']:
+            print(f"Набор файлов изменился с прошлого запуска (ожидался {state['last_path']}), "
+                  f"начните заново без чекпоинта", file=sys.stderr)
+            return state
+
+    truncate_output(args.output, state['output_size'])
+    # После обрезки корпус совпадает с чекпоинтом; индекс, не совпадающий с корпусом, перестраивается
+    index = open_index(args.output)
+    if state['done']:
+        print(f"Продолжаем с файла {state['done']}, в корпусе {len(index)} позиций", file=sys.stderr)
+
+    t_start = time.time()
+    started = state['done']
+    workers = args.workers or os.cpu_count() or 1
+    offset = state['output_size']
+    try:
+        # 'a+b': запись всегда в конец, чтение — для сверки строки при совпадении хеша
+        with ProcessPoolExecutor(max_workers=workers) as executor, open(args.output, 'a+b') as out:
+            for batch, results in iter_converted(executor, paths, args.board_width, args.batch, 4 * workers):
+                for path, (fen, key, error) in zip(batch, results):
+                    if fen is None:
+                        print(f"Ошибка разбора {path}: {error}", file=sys.stderr)
+                        state['errors'] += 1
+                        continue
+                    if find(index, out, fen, key) is not None:
+                        state['duplicates'] += 1
+                        continue
+                    index.add(key, offset)
+                    line = f"{fen}\t{path}\n".encode('utf-8')
+                    out.write(line)
+                    offset += len(line)
+                    state['written'] += 1
+                out.flush()
+                # Сначала индекс, потом чекпоинт: при обрыве между ними индекс просто перестроится
+                index.commit(offset)
+                state['done'] += len(batch)
+                state['last_path'] = batch[-1]
+                state['output_size'] = offset
+                if args.checkpoint:
+                    save_checkpoint(args.checkpoint, state)
+    finally:
+        index.close()
+
+    elapsed = time.time() - t_start
+    done = state['done'] - started
+    print(f"Снимков: {done} за {elapsed:.1f}s ({done / elapsed if elapsed else 0:.0f}/s), "
+          f"в корпусе {state['written']} позиций, дублей {state['duplicates']}, ошибок {state['errors']}",
+          file=sys.stderr)
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Корпус уникальных FEN из каталогов HTML-снимков доски")
+    parser.add_argument('paths', nargs='+', help="HTML-файлы или каталоги со снимками")
+    parser.add_argument('--output', default='corpus.tsv', help="Файл корпуса: FEN<TAB>путь на строку")
+    parser.add_argument('--checkpoint', default='corpus.ckpt', help="Файл чекпоинта; пустая строка — без чекпоинтов")
+    parser.add_argument('--workers', type=int, default=None, help="Процессов разбора (по умолчанию — все ядра)")
+    parser.add_argument('--batch', type=int, default=64, help="Файлов в одной задаче для процесса")
+    parser.add_argument('--board-width', type=float, default=None,
+                        help="Ширина доски в px, если её нет в разметке (по умолчанию 436)")
+    args = parser.parse_args(argv)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# Пул долгоживущих процессов Stockfish.
+# python-stockfish синхронный, поэтому каждый движок работает в своём потоке,
+# а event loop остаётся свободным. Упавший движок пересоздаётся автоматически.
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+from movegen import validate_fen
+from settings import SETTING, stockfish_path
+from uci import parse_info
+
+
+def default_pool_size(threads=None):
+    threads = threads or SETTING.threads
+    return max(1, (os.cpu_count() or 1) // max(1, threads))
+
+
+class EngineWorker:
+    def __init__(self, worker_id, threads, hash_size):
+        self.worker_id = worker_id
+        self.threads = threads
+        self.hash_size = hash_size
+        self.stockfish = None
+        self.multipv = 1
+        self.restarts = 0
+
+    def spawn(self):
+        # python-stockfish нужен только когда движок действительно запускается
+        from stockfish import Stockfish
+        stockfish = Stockfish(path=stockfish_path(), parameters={
+            "Threads": self.threads,
+            "Hash": self.hash_size
+        })
+        stockfish.set_skill_level(20)
+        if SETTING.depth:
+            stockfish.set_depth(SETTING.depth)
+        self.stockfish = stockfish
+        self.multipv = 1
+
+    def close(self):
+        if self.stockfish is None:
+            return
+        try:
+            self.stockfish.send_quit_command()
+        except Exception:
+            pass
+        self.stockfish = None
+
+    def _run(self, call):
+        # Один перезапуск на запрос: если движок упал — пересоздаём и повторяем
+        for attempt in range(2):
+            try:
+                if self.stockfish is None:
+                    self.spawn()
+                return call(self.stockfish)
+            except Exception as e:
+                print(f"Stockfish #{self.worker_id} крэшнулся: {e}")
+                self.close()
+                self.restarts += 1
+                metrics.incr('engine_restarts')
+        return None
+
+    def _set_multipv(self, stockfish, multipv):
+        if self.multipv != multipv:
+            stockfish.update_engine_parameters({"MultiPV": multipv})
+            self.multipv = multipv
+
+    def analyse(self, fen, think_time, depth=None):
+        def call(stockfish):
+            self._set_multipv(stockfish, 1)
+            stockfish.set_fen_position(fen)
+            if depth:
+                # Глубина — только на этот запрос: set_depth меняет её у движка насовсем, поэтому возвращаем прежнюю
+                default = stockfish.depth
+                stockfish.set_depth(depth)
+                try:
+                    return stockfish.get_best_move()
+                finally:
+                    stockfish.depth = default
+            return stockfish.get_best_move_time(think_time)
+        t_start = time.perf_counter()
+        move = self._run(call)
+        # Последняя строка info перед bestmove — оценка и достигнутая глубина
+        info = parse_info(getattr(self.stockfish, 'info', '') or '') if move else None
+        info = info or {}
+        return {
+            'fen': fen,
+            'move': move,
+            'score': info.get('score'),
+            'mate': info.get('mate'),
+            'depth': info.get('depth'),
+            'time': time.perf_counter() - t_start,
+        }
+
+    def analyse_multipv(self, fen, multipv, think_time, depth=None):
+        # Один поиск с MultiPV = K вместо K отдельных. get_top_moves из python-stockfish не отдаёт
+        # варианты целиком, поэтому команду go отправляем сами и разбираем строки info
+        def call(stockfish):
+            self._set_multipv(stockfish, multipv)
+            stockfish.set_fen_position(fen)
+            stockfish._put(f"go depth {depth}" if depth else f"go movetime {think_time}")
+            lines = {}
+            while True:
+                text = stockfish._read_line()
+                if text.startswith('bestmove'):
+                    return lines
+                info = parse_info(text)
+                # Строки с границей (lowerbound/upperbound) — промежуточные, их пропускаем
+                if info and info['pv'] and 'bound' not in info:
+                    lines[info.get('multipv', 1)] = info
+
+        t_start = time.perf_counter()
+        lines = self._run(call) or {}
+        return {
+            'fen': fen,
+            'lines': [
+                {
+                    'move': info['pv'][0],
+                    'score': info['score'],
+                    'mate': info['mate'],
+                    'depth': info.get('depth'),
+                    'pv': ' '.join(info['pv']),
+                }
+                for _, info in sorted(lines.items())
+            ],
+            'time': time.perf_counter() - t_start,
+        }
+
+
+class EnginePool:
+    def __init__(self, size=None, threads=None, hash_size=None, cache=None, tablebase=None):
+        self.cache = cache
+        self.tablebase = tablebase
+        self.threads = threads or SETTING.threads
+        self.hash_size = hash_size or SETTING.hash_size
+        self.size = size or SETTING.engines or default_pool_size(self.threads)
+        self.workers = [EngineWorker(i, self.threads, self.hash_size) for i in range(self.size)]
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='stockfish')
+        self._idle = None
+
+    def start(self):
+        # Прогрев: запустить все процессы заранее. Без него движки стартуют при первом запросе,
+        # а позиции из кэша и таблиц вообще не запускают Stockfish
+        for worker in self.workers:
+            if worker.stockfish is None:
+                worker.spawn()
+        print(f"Пул Stockfish: {self.size} процесс(ов) по {self.threads} потоков, Hash {self.hash_size} МБ")
+
+    @property
+    def restarts(self):
+        return sum(worker.restarts for worker in self.workers)
+
+    async def _call(self, method, *args):
+        # Очередь свободных движков создаётся внутри работающего event loop
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for worker in self.workers:
+                self._idle.put_nowait(worker)
+            if all(worker.stockfish is None for worker in self.workers):
+                print(f"Пул Stockfish: до {self.size} процесс(ов) по {self.threads} потоков, "
+                      f"Hash {self.hash_size} МБ, запуск по первому запросу")
+        worker = await self._idle.get()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, getattr(worker, method), *args)
+        finally:
+            self._idle.put_nowait(worker)
+
+    def _rejected(self, fen):
+        # Невалидная позиция может уронить Stockfish — проверяем её локально, до движка
+        with metrics.span('fen_validate'):
+            ok, reason = validate_fen(fen)
+        if ok:
+            return None
+        metrics.incr('rejected_fens')
+        return reason
+
+    async def analyse(self, fen, think_time=None, depth=None):
+        # Поиск либо по времени (мс), либо до заданной глубины
+        think_time = None if depth else think_time or SETTING.thinking_time
+        error = self._rejected(fen)
+        if error:
+            return {'fen': fen, 'move': None, 'score': None, 'mate': None, 'depth': None, 'time': 0.0,
+                    'error': error}
+        if self.tablebase is not None:
+            # Эндшпиль из таблиц: точный ход без поиска
+            t_start = time.perf_counter()
+            hit = self.tablebase.probe(fen)
+            if hit:
+                return {'fen': fen, 'move': hit['move'], 'score': None, 'mate': None, 'depth': None,
+                        'time': time.perf_counter() - t_start, 'tablebase': True, 'wdl': hit['wdl'], 'dtz': hit['dtz']}
+        if self.cache is not None:
+            cached = self.cache.get(fen, depth=depth, think_time=think_time)
+            if cached:
+                return {'fen': fen, 'move': cached['move'], 'score': cached['score'], 'mate': cached['mate'],
+                        'depth': cached['depth'], 'time': 0.0, 'cached': True}
+        with metrics.span('engine_analyse'):
+            result = await self._call('analyse', fen, think_time, depth)
+        if self.cache is not None:
+            self.cache.put(fen, result, depth=depth, think_time=think_time)
+        return result
+
+    async def analyse_multipv(self, fen, multipv=3, think_time=None, depth=None):
+        think_time = None if depth else think_time or SETTING.thinking_time
+        error = self._rejected(fen)
+        if error:
+            return {'fen': fen, 'lines': [], 'time': 0.0, 'error': error}
+        with metrics.span('engine_multipv'):
+            return await self._call('analyse_multipv', fen, multipv, think_time, depth)
+
+    async def analyse_many(self, fens, think_time=None, depth=None, multipv=1):
+        # Отдаёт (индекс, результат) по мере готовности; в работе не больше 2 * size позиций,
+        # так что fens может быть генератором на миллионы строк. При multipv > 1 результат — все K линий
+        fens = iter(enumerate(fens))
+        pending = set()
+
+        async def run(index, fen):
+            if multipv > 1:
+                return index, await self.analyse_multipv(fen, multipv, think_time, depth)
+            return index, await self.analyse(fen, think_time, depth)
+
+        def submit():
+            item = next(fens, None)
+            if item is None:
+                return False
+            pending.add(asyncio.ensure_future(run(*item)))
+            return True
+
+        for _ in range(self.size * 2):
+            if not submit():
+                break
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    yield task.result()
+                    submit()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+        if self.tablebase is not None:
+            self.tablebase.close()
+        for worker in self.workers:
+            worker.close()
+        self._executor.shutdown(wait=False)
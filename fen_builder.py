@@ -0,0 +1,207 @@
+# Сборка FEN из списка фигур chessground без браузера.
+# Используется и в Chess._parse_board_to_fen, и в офлайн-разборе сохранённых HTML.
+from board import Board, SQUARE_NAMES
+from metrics import metrics
+
+PIECE_MAP = {
+    'white king': 'K', 'white queen': 'Q', 'white rook': 'R', 'white bishop': 'B',
+    'white knight': 'N', 'white pawn': 'P',
+    'black king': 'k', 'black queen': 'q', 'black rook': 'r', 'black bishop': 'b',
+    'black knight': 'n', 'black pawn': 'p'
+}
+
+
+def _chebyshev(a, b):
+    return max(abs(a % 8 - b % 8), abs(a // 8 - b // 8))
+
+
+# Клетки в радиусе двух полей, от ближних к дальним — для поиска фигуры после рокировки
+NEIGHBOURS = [
+    sorted((other for other in range(64) if 0 < _chebyshev(square, other) <= 2),
+           key=lambda other, square=square: _chebyshev(square, other))
+    for square in range(64)
+]
+
+
+def parse_transform(transform):
+    # 'translate(218px, 381.5px)' -> (218.0, 381.5)
+    if not transform or 'translate' not in transform:
+        return None
+    try:
+        coords = transform.split('(')[1].split(')')[0].split(',')
+        x = float(coords[0].replace('px', '').strip())
+        y = float(coords[1].replace('px', '').strip())
+        return x, y
+    except (IndexError, ValueError):
+        return None
+
+
+def coords_to_index(x, y, square_size, orientation='white'):
+    # Верхний левый угол — a8 у белых и h1 у чёрных
+    file = min(max(int(x // square_size), 0), 7)
+    rank = min(max(int(y // square_size), 0), 7)
+    if orientation == 'black':
+        return rank * 8 + (7 - file)
+    return (7 - rank) * 8 + file
+
+
+def coords_to_square(x, y, square_size, orientation='white'):
+    try:
+        return SQUARE_NAMES[coords_to_index(float(x), float(y), square_size, orientation)]
+    except Exception as e:
+        print(f"Ошибка преобразования координат: x={x}, y={y}, ошибка: {e}")
+        return None
+
+
+def _js_number(value):
+    # Так браузер печатает числа в style.transform: 0 -> '0', 54.5 -> '54.5'
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class TransformTable:
+    # Таблица transform <-> клетка для одной пары (square_size, orientation).
+    # Строится один раз, незнакомые строки (анимация, другой формат) разбираются и запоминаются.
+    __slots__ = ('square_size', 'orientation', 'to_index', 'transforms', 'centers')
+
+    MAX_EXTRA = 4096
+
+    def __init__(self, square_size, orientation):
+        self.square_size = square_size
+        self.orientation = orientation
+        self.to_index = {}
+        self.transforms = [None] * 64
+        self.centers = [None] * 64
+        for index in range(64):
+            file, rank = index % 8, index // 8
+            if orientation == 'black':
+                col, row = 7 - file, rank
+            else:
+                col, row = file, 7 - rank
+            x, y = col * square_size, row * square_size
+            transform = f"translate({_js_number(x)}px, {_js_number(y)}px)"
+            self.transforms[index] = transform
+            self.to_index[transform] = index
+            self.to_index[transform.replace(', ', ',')] = index
+            self.centers[index] = {'x': x + square_size / 2, 'y': y + square_size / 2}
+
+    def index(self, transform):
+        index = self.to_index.get(transform)
+        if index is not None or not transform:
+            return index
+        coords = parse_transform(transform)
+        if coords is None:
+            return None
+        index = coords_to_index(coords[0], coords[1], self.square_size, self.orientation)
+        if len(self.to_index) < self.MAX_EXTRA:
+            self.to_index[transform] = index
+        return index
+
+    def transform(self, index):
+        return self.transforms[index]
+
+    def center(self, index):
+        return self.centers[index]
+
+
+_TABLES = {}
+
+
+def transform_table(square_size, orientation):
+    key = (square_size, orientation)
+    table = _TABLES.get(key)
+    if table is None:
+        table = _TABLES[key] = TransformTable(square_size, orientation)
+    return table
+
+
+def detect_castling_rights(board):
+    return board.castling_rights()
+
+
+def clean_class(class_name):
+    return class_name.replace(' dragging', '').replace(' ghost', '')
+
+
+def _color_after(piece):
+    # Последним ходила фигура этого цвета — значит ходит соперник
+    return 'b' if piece.isupper() else 'w'
+
+
+def build_board(pieces, square_size, orientation, verbose=False):
+    board = Board()
+    table = transform_table(square_size, orientation)
+    for piece in pieces:
+        class_name = piece['class']
+        if 'ghost' in class_name:
+            continue
+        letter = PIECE_MAP.get(class_name) or PIECE_MAP.get(clean_class(class_name))
+        if not letter:
+            continue
+        index = table.index(piece['transform'])
+        if index is None:
+            continue
+        if not board.put(index, letter):
+            metrics.incr('overlapping_pieces')
+            if verbose:
+                print(f"❗ Клетка {SQUARE_NAMES[index]} уже занята {board.get(index)}, не перезаписываем {letter}")
+    return board
+
+
+def last_move_squares(last_moves, square_size, orientation):
+    table = transform_table(square_size, orientation)
+    squares = []
+    for transform in last_moves:
+        index = table.index(transform)
+        if index is not None:
+            squares.append(index)
+    return squares
+
+
+def side_to_move(board, last_squares, verbose=False):
+    return side_to_move_reason(board, last_squares, verbose)[0]
+
+
+def side_to_move_reason(board, last_squares, verbose=False):
+    # (очередь хода, причина): причина — None, если цвет взят с фигуры, иначе почему пришлось угадывать
+    if not last_squares:
+        return 'w', "нет клеток last-move, по умолчанию ход белых"
+    if verbose:
+        print(f"Обнаружены last-move: {len(last_squares)} клеток: {[SQUARE_NAMES[s] for s in last_squares]}")
+
+    # Сначала пытаемся найти фигуру точно на одной из last-move клеток
+    for square in last_squares:
+        piece = board.get(square)
+        if piece:
+            if verbose:
+                print(f"Фигура на last-move: {piece} на {SQUARE_NAMES[square]}")
+            return _color_after(piece), None
+
+    # Если точная фигура не найдена — ищем ближайшую к любой клетке. Это значит была рокировка и фигур нету на пунктах назначения.
+    # Например Ke1=>Kg1 Rh8=>Rf1, клетки в last move будет e1 и h8, но фигур там уже не будет
+    if verbose:
+        print("Фигура на last-move не найдена, ищем ближайшие фигуры")
+    for square in last_squares:
+        for other in NEIGHBOURS[square]:
+            piece = board.get(other)
+            if piece:
+                if verbose:
+                    print(f"Найдена ближайшая фигура: {piece} на {SQUARE_NAMES[other]}")
+                return _color_after(piece), None
+
+    if verbose:
+        print("Фигура на last-move и ближайшие не найдены, используем цвет по умолчанию: w")
+    return 'w', f"на клетках last-move {','.join(SQUARE_NAMES[s] for s in sorted(last_squares))} и рядом нет фигур, по умолчанию ход белых"
+
+
+def board_to_fen(board, active_color, castling=None, en_passant='-', halfmove=0, fullmove=1):
+    if castling is None:
+        castling = board.castling_rights()
+    return f"{board.placement()} {active_color} {castling} {en_passant} {halfmove} {fullmove}"
+
+
+def build_fen(pieces, last_moves, square_size, orientation, verbose=False):
+    # pieces: [{'class': 'white king', 'transform': 'translate(...)'}], last_moves: ['translate(...)']
+    with metrics.span('board_parse'):
+        board = build_board(pieces, square_size, orientation, verbose)
+        active_color = side_to_move(board, last_move_squares(last_moves, square_size, orientation), verbose)
+        return board_to_fen(board, active_color)
@@ -0,0 +1,174 @@
+# Лёгкая инструментация горячих участков вместо print с time.time().
+# Интервалы меряются perf_counter_ns и складываются в гистограммы, события — в счётчики.
+# Выключенный режим подменяет методы заглушками, так что замеры почти ничего не стоят.
+import bisect
+import json
+import time
+
+from settings import SETTING
+
+# Границы корзин гистограмм, нс: от 10 мкс до 60 с
+BUCKETS_NS = [
+    10_000, 25_000, 50_000, 100_000, 250_000, 500_000,
+    1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000,
+    100_000_000, 250_000_000, 500_000_000, 1_000_000_000, 2_500_000_000,
+    5_000_000_000, 10_000_000_000, 60_000_000_000,
+]
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_NS) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value_ns):
+        self.counts[bisect.bisect_left(BUCKETS_NS, value_ns)] += 1
+        self.count += 1
+        self.total += value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+
+    def quantile(self, q):
+        # Оценка сверху: граница корзины, в которую попал квантиль
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_NS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum_ms': round(self.total / 1e6, 3),
+            'p50_ms': round(self.quantile(0.5) / 1e6, 3) if self.count else None,
+            'p95_ms': round(self.quantile(0.95) / 1e6, 3) if self.count else None,
+            'max_ms': round(self.max / 1e6, 3),
+        }
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+def _null_span(name):
+    return _NULL_SPAN
+
+
+class Metrics:
+    def __init__(self, enabled=True, prefix='chess'):
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self.enabled = False
+        if enabled:
+            self.enable()
+        else:
+            self.disable()
+
+    def enable(self):
+        # Убираем заглушки с экземпляра — снова работают методы класса
+        for name in ('span', 'incr', 'observe'):
+            self.__dict__.pop(name, None)
+        self.enabled = True
+
+    def disable(self):
+        self.span = _null_span
+        self.incr = _noop
+        self.observe = _noop
+        self.enabled = False
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def incr(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value_ns):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(value_ns)
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+
+    def snapshot(self):
+        return {
+            'ts': round(time.time(), 3),
+            'counters': dict(self.counters),
+            'spans': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+        }
+
+    def write_json_line(self, path):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.snapshot(), ensure_ascii=False) + '\n')
+
+    def to_prometheus(self):
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS_NS, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound / 1e9:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {histogram.total / 1e9:.9f}")
+            lines.append(f"{metric}_count {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+
+    def export(self, path):
+        # Формат по расширению: .prom — текстовый формат Prometheus, иначе JSON Lines
+        if path.endswith('.prom'):
+            self.write_prometheus(path)
+        else:
+            self.write_json_line(path)
+
+
+metrics = Metrics(enabled=SETTING.metrics)
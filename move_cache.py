@@ -0,0 +1,137 @@
+# Кэш лучших ходов по нормализованному FEN (без счётчиков ходов).
+# В памяти — LRU в пределах бюджета, на диске — SQLite, чтобы после перезапуска
+# не анализировать уже известные позиции заново.
+import sys
+from collections import OrderedDict
+
+from metrics import metrics
+
+# Накладные расходы OrderedDict на одну запись (узел списка + слот хеш-таблицы), примерно
+_ENTRY_OVERHEAD = 120
+
+
+def normalize_fen(fen):
+    # Расстановка, очередь хода, рокировки и взятие на проходе; счётчики отбрасываем
+    return ' '.join(fen.split()[:4])
+
+
+def _covers(entry, depth=None, think_time=None):
+    # Мелкий результат не подменяет запрошенный более глубокий анализ
+    if depth is not None and (entry['depth'] or 0) < depth:
+        return False
+    if think_time is not None and (entry['think_time'] or 0) < think_time:
+        return False
+    return True
+
+
+class MoveCache:
+    def __init__(self, path=None, max_mb=64, commit_every=256):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.commit_every = commit_every
+        self.entries = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        self.db = None
+        if path:
+            import sqlite3
+            self.db = sqlite3.connect(path)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.execute('''CREATE TABLE IF NOT EXISTS moves (
+                key TEXT PRIMARY KEY,
+                move TEXT,
+                score INTEGER,
+                mate INTEGER,
+                depth INTEGER,
+                think_time INTEGER
+            )''')
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _remember(self, key, entry):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.used_bytes -= old['_size']
+        entry['_size'] = sys.getsizeof(key) + sys.getsizeof(entry) + _ENTRY_OVERHEAD
+        self.entries[key] = entry
+        self.used_bytes += entry['_size']
+        while self.used_bytes > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.used_bytes -= evicted['_size']
+
+    def _load(self, key):
+        if self.db is None:
+            return None
+        row = self.db.execute(
+            'SELECT move, score, mate, depth, think_time FROM moves WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        entry = {'move': row[0], 'score': row[1], 'mate': row[2], 'depth': row[3], 'think_time': row[4]}
+        self._remember(key, entry)
+        return entry
+
+    def get(self, fen, depth=None, think_time=None):
+        key = normalize_fen(fen)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self._load(key)
+        if entry is None or not _covers(entry, depth, think_time):
+            self.misses += 1
+            metrics.incr('cache_misses')
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        metrics.incr('cache_hits')
+        return {'move': entry['move'], 'score': entry['score'], 'mate': entry['mate'],
+                'depth': entry['depth'], 'think_time': entry['think_time']}
+
+    def put(self, fen, result, depth=None, think_time=None):
+        if not result.get('move'):
+            return
+        key = normalize_fen(fen)
+        old = self.entries.get(key) or self._load(key)
+        entry = {
+            'move': result['move'],
+            'score': result.get('score'),
+            'mate': result.get('mate'),
+            'depth': result.get('depth') or depth,
+            'think_time': think_time,
+        }
+        # Не затираем более глубокий результат более мелким
+        if old is not None and _covers(old, entry['depth'], entry['think_time']):
+            return
+        self._remember(key, entry)
+        if self.db is not None:
+            self.db.execute(
+                'INSERT OR REPLACE INTO moves VALUES (?, ?, ?, ?, ?, ?)',
+                (key, entry['move'], entry['score'], entry['mate'], entry['depth'], entry['think_time'])
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self.flush()
+
+    def flush(self):
+        if self.db is not None and self._pending:
+            self.db.commit()
+            self._pending = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'used_mb': round(self.used_bytes / (1024 * 1024), 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
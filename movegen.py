@@ -0,0 +1,323 @@
+# Локальная проверка FEN и генерация легальных ходов без процесса Stockfish.
+# Доска — те же 64 байта Board; атаки считаются по заранее посчитанным таблицам прыжков и лучей.
+from board import EMPTY, SQUARE_INDEX, SQUARE_NAMES, Position
+
+_KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+_KING_STEPS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+_ROOK_DIRS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+_BISHOP_DIRS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def _jumps(steps):
+    table = []
+    for square in range(64):
+        file, rank = square % 8, square // 8
+        table.append(tuple(
+            (rank + dr) * 8 + file + df
+            for df, dr in steps if 0 <= file + df < 8 and 0 <= rank + dr < 8
+        ))
+    return table
+
+
+def _rays(directions):
+    table = []
+    for square in range(64):
+        file, rank = square % 8, square // 8
+        rays = []
+        for df, dr in directions:
+            ray = []
+            f, r = file + df, rank + dr
+            while 0 <= f < 8 and 0 <= r < 8:
+                ray.append(r * 8 + f)
+                f, r = f + df, r + dr
+            if ray:
+                rays.append(tuple(ray))
+        table.append(tuple(rays))
+    return table
+
+
+KNIGHT_MOVES = _jumps(_KNIGHT_STEPS)
+KING_MOVES = _jumps(_KING_STEPS)
+ROOK_RAYS = _rays(_ROOK_DIRS)
+BISHOP_RAYS = _rays(_BISHOP_DIRS)
+# Клетки, с которых пешка данного цвета бьёт клетку: PAWN_ATTACKERS[белые][клетка]
+PAWN_ATTACKERS = (
+    _jumps(((-1, -1), (1, -1))),
+    _jumps(((-1, 1), (1, 1))),
+)
+
+_CODES = {piece: ord(piece) for piece in 'KQRBNPkqrbnp'}
+_FEN_PIECES = set('KQRBNPkqrbnp')
+_PROMOTIONS = 'qrbn'
+_PAWNS = (_CODES['P'], _CODES['p'])
+
+
+def is_white(code):
+    return 65 <= code <= 90
+
+
+def attacked(squares, square, by_white):
+    # Бьёт ли сторона by_white клетку square
+    if by_white:
+        pawn, knight, king, rook, bishop, queen = (_CODES[p] for p in 'PNKRBQ')
+    else:
+        pawn, knight, king, rook, bishop, queen = (_CODES[p] for p in 'pnkrbq')
+    for source in PAWN_ATTACKERS[0 if by_white else 1][square]:
+        if squares[source] == pawn:
+            return True
+    for source in KNIGHT_MOVES[square]:
+        if squares[source] == knight:
+            return True
+    for source in KING_MOVES[square]:
+        if squares[source] == king:
+            return True
+    for ray in ROOK_RAYS[square]:
+        for source in ray:
+            code = squares[source]
+            if code != EMPTY:
+                if code == rook or code == queen:
+                    return True
+                break
+    for ray in BISHOP_RAYS[square]:
+        for source in ray:
+            code = squares[source]
+            if code != EMPTY:
+                if code == bishop or code == queen:
+                    return True
+                break
+    return False
+
+
+def attackers(squares, square, by_white):
+    # Все клетки фигур стороны by_white, бьющих клетку square
+    side = 'PNKRBQ' if by_white else 'pnkrbq'
+    pawn, knight, king, rook, bishop, queen = (_CODES[p] for p in side)
+    result = [source for source in PAWN_ATTACKERS[0 if by_white else 1][square] if squares[source] == pawn]
+    result += [source for source in KNIGHT_MOVES[square] if squares[source] == knight]
+    result += [source for source in KING_MOVES[square] if squares[source] == king]
+    for rays, sliders in ((ROOK_RAYS, (rook, queen)), (BISHOP_RAYS, (bishop, queen))):
+        for ray in rays[square]:
+            for source in ray:
+                code = squares[source]
+                if code != EMPTY:
+                    if code in sliders:
+                        result.append(source)
+                    break
+    return result
+
+
+def king_square(squares, white):
+    return squares.find(_CODES['K' if white else 'k'])
+
+
+def in_check(position, white=None):
+    if white is None:
+        white = position.turn == 'w'
+    squares = position.board.squares
+    king = king_square(squares, white)
+    return king >= 0 and attacked(squares, king, not white)
+
+
+def _pseudo_moves(position):
+    squares = position.board.squares
+    white = position.turn == 'w'
+    forward = 8 if white else -8
+    start_rank = 1 if white else 6
+    for source in range(64):
+        code = squares[source]
+        if code == EMPTY or is_white(code) != white:
+            continue
+        kind = chr(code).lower()
+        if kind == 'p':
+            target = source + forward
+            if 0 <= target < 64 and squares[target] == EMPTY:
+                yield source, target
+                if source // 8 == start_rank and squares[target + forward] == EMPTY:
+                    yield source, target + forward
+            for target in PAWN_ATTACKERS[1 if white else 0][source]:
+                victim = squares[target]
+                if (victim != EMPTY and is_white(victim) != white) or target == position.ep:
+                    yield source, target
+        elif kind == 'n' or kind == 'k':
+            for target in (KNIGHT_MOVES if kind == 'n' else KING_MOVES)[source]:
+                victim = squares[target]
+                if victim == EMPTY or is_white(victim) != white:
+                    yield source, target
+        else:
+            rays = ()
+            if kind in 'rq':
+                rays += ROOK_RAYS[source]
+            if kind in 'bq':
+                rays += BISHOP_RAYS[source]
+            for ray in rays:
+                for target in ray:
+                    victim = squares[target]
+                    if victim == EMPTY:
+                        yield source, target
+                        continue
+                    if is_white(victim) != white:
+                        yield source, target
+                    break
+
+
+def _castling_moves(position):
+    squares = position.board.squares
+    white = position.turn == 'w'
+    rights = position.castling
+    if rights == '-':
+        return
+    king, rank = ('K', 0) if white else ('k', 56)
+    if squares[rank + 4] != _CODES[king] or attacked(squares, rank + 4, not white):
+        return
+    rook = _CODES['R' if white else 'r']
+    # (право, клетка ладьи, клетки между, клетки пути короля, цель короля)
+    for right, rook_square, between, path, target in (
+        ('K' if white else 'k', rank + 7, (rank + 5, rank + 6), (rank + 5, rank + 6), rank + 6),
+        ('Q' if white else 'q', rank, (rank + 1, rank + 2, rank + 3), (rank + 3, rank + 2), rank + 2),
+    ):
+        if right not in rights or squares[rook_square] != rook:
+            continue
+        if any(squares[square] != EMPTY for square in between):
+            continue
+        if any(attacked(squares, square, not white) for square in path):
+            continue
+        yield rank + 4, target
+
+
+def legal_moves(position):
+    # Список легальных ходов в UCI
+    squares = position.board.squares
+    white = position.turn == 'w'
+    king_code = _CODES['K' if white else 'k']
+    king = squares.find(king_code)
+    last_rank = 7 if white else 0
+    moves = []
+    for source, target in _pseudo_moves(position):
+        code = squares[source]
+        captured = squares[target]
+        victim = None
+        # Ход делаем прямо на доске и откатываем — без копирования позиции
+        squares[target] = code
+        squares[source] = EMPTY
+        if code in _PAWNS and captured == EMPTY and (target - source) % 8:
+            victim = target - 8 if white else target + 8
+            victim_code = squares[victim]
+            squares[victim] = EMPTY
+        own_king = target if code == king_code else king
+        legal = own_king < 0 or not attacked(squares, own_king, not white)
+        squares[source] = code
+        squares[target] = captured
+        if victim is not None:
+            squares[victim] = victim_code
+        if not legal:
+            continue
+        move = SQUARE_NAMES[source] + SQUARE_NAMES[target]
+        if code in _PAWNS and target // 8 == last_rank:
+            moves.extend(move + piece for piece in _PROMOTIONS)
+        else:
+            moves.append(move)
+    for source, target in _castling_moves(position):
+        moves.append(SQUARE_NAMES[source] + SQUARE_NAMES[target])
+    return moves
+
+
+def is_checkmate(position):
+    return in_check(position) and not legal_moves(position)
+
+
+def _check_placement(placement):
+    rows = placement.split('/')
+    if len(rows) != 8:
+        return "в расстановке должно быть 8 горизонталей"
+    for row in rows:
+        width = 0
+        previous_digit = False
+        for char in row:
+            if char.isdigit():
+                if previous_digit or char in '09':
+                    return f"неверная горизонталь {row}"
+                width += int(char)
+                previous_digit = True
+            elif char in _FEN_PIECES:
+                width += 1
+                previous_digit = False
+            else:
+                return f"неизвестный символ {char}"
+        if width != 8:
+            return f"горизонталь {row} не из 8 клеток"
+    return None
+
+
+def validate_fen(fen):
+    # Возвращает (True, None) или (False, причина)
+    fields = fen.split() if isinstance(fen, str) else []
+    if len(fields) < 4 or len(fields) > 6:
+        return False, "FEN должен содержать от 4 до 6 полей"
+    error = _check_placement(fields[0])
+    if error:
+        return False, error
+    if fields[1] not in ('w', 'b'):
+        return False, "очередь хода должна быть w или b"
+    castling = fields[2]
+    if castling != '-' and (not castling or any(c not in 'KQkq' for c in castling) or len(set(castling)) != len(castling)):
+        return False, f"неверные права рокировки {castling}"
+    ep = fields[3]
+    if ep != '-' and ep not in SQUARE_INDEX:
+        return False, f"неверное поле взятия на проходе {ep}"
+    for counter in fields[4:]:
+        if not counter.isdigit():
+            return False, f"неверный счётчик ходов {counter}"
+    if len(fields) == 6 and int(fields[5]) < 1:
+        return False, "номер хода должен быть не меньше 1"
+
+    position = Position.from_fen(fen)
+    squares = position.board.squares
+    for king in 'Kk':
+        if squares.count(_CODES[king]) != 1:
+            return False, f"должен быть ровно один король {king}"
+    for pawn in 'Pp':
+        if squares.count(_CODES[pawn]) > 8:
+            return False, f"больше 8 пешек {pawn}"
+    if sum(1 for code in squares if code != EMPTY and is_white(code)) > 16:
+        return False, "больше 16 белых фигур"
+    if sum(1 for code in squares if code != EMPTY and not is_white(code)) > 16:
+        return False, "больше 16 чёрных фигур"
+    for square in list(range(8)) + list(range(56, 64)):
+        if squares[square] in _PAWNS:
+            return False, f"пешка на крайней горизонтали {SQUARE_NAMES[square]}"
+
+    for right, king, rook in (('K', 4, 7), ('Q', 4, 0), ('k', 60, 63), ('q', 60, 56)):
+        if right in castling:
+            white = right.isupper()
+            if squares[king] != _CODES['K' if white else 'k'] or squares[rook] != _CODES['R' if white else 'r']:
+                return False, f"право рокировки {right} без короля и ладьи на местах"
+
+    white = position.turn == 'w'
+    if position.ep is not None:
+        # Поле за пешкой, только что сделавшей двойной ход соперника
+        rank = position.ep // 8
+        pawn = position.ep - 8 if white else position.ep + 8
+        if rank != (5 if white else 2) or squares[pawn] != _CODES['p' if white else 'P']:
+            return False, f"невозможное поле взятия на проходе {ep}"
+
+    if in_check(position, not white):
+        return False, "сторона, которая не ходит, под шахом"
+    if len(attackers(squares, king_square(squares, white), not white)) > 2:
+        return False, "шах больше чем от двух фигур"
+    return True, None
+
+
+def is_fen_valid(fen):
+    return validate_fen(fen)[0]
+
+
+def perft(position, depth):
+    # Число позиций на глубине depth — для проверки генератора на известных значениях
+    if depth == 0:
+        return 1
+    total = 0
+    for move in legal_moves(position):
+        child = position.copy()
+        child.push_uci(move)
+        total += perft(child, depth - 1)
+    return total
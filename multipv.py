@@ -0,0 +1,75 @@
+# Пакетный анализ с MultiPV: K лучших линий за один поиск и проверка единственности решения.
+import argparse
+import json
+import time
+
+from readers import iter_fens
+from settings import SETTING
+
+MATE_SCORE = 100000
+
+
+def line_value(line):
+    # Мат приводим к большой оценке: чем быстрее мат, тем выше
+    if line['mate'] is not None:
+        return MATE_SCORE - line['mate'] if line['mate'] > 0 else -MATE_SCORE - line['mate']
+    return line['score'] or 0
+
+
+def is_unique_solution(record, win_cp=200, margin_cp=150):
+    # «Единственный ход»: лучшая линия выигрывает, а вторая заметно хуже
+    lines = record['lines']
+    if not lines:
+        return False
+    best = line_value(lines[0])
+    if best < win_cp:
+        return False
+    if len(lines) == 1:
+        return True
+    return best - line_value(lines[1]) >= margin_cp
+
+
+def _multipv(value):
+    # Единственность решения проверяется по отрыву от второй линии, с одной линией её не проверить
+    value = int(value)
+    if value < 2:
+        raise argparse.ArgumentTypeError("нужно не меньше 2 линий")
+    return value
+
+
+async def run(args):
+    from engine_pool import EnginePool
+    engines = EnginePool(size=args.engines, threads=args.threads)
+    t_start = time.time()
+    count = unique = 0
+    try:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            async for _, record in engines.analyse_many(iter_fens(args.fens), args.think_time, args.depth, args.multipv):
+                record['unique'] = is_unique_solution(record, args.win_cp, args.margin_cp)
+                record['time'] = round(record['time'], 4)
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+                unique += record['unique']
+    finally:
+        engines.close()
+    print(f"Позиций: {count}, с единственным решением: {unique}, время: {(time.time() - t_start):.1f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MultiPV-анализ позиций через пул Stockfish")
+    parser.add_argument('fens', help="Файл с FEN (по одному в строке) или '-' для stdin")
+    parser.add_argument('--output', default='multipv.jsonl', help="Файл результатов (JSON Lines)")
+    parser.add_argument('--multipv', type=_multipv, default=3, help="Сколько лучших линий возвращать (не меньше 2)")
+    parser.add_argument('--think-time', type=int, default=SETTING.thinking_time, help="Время на позицию, мс")
+    parser.add_argument('--depth', type=int, default=None, help="Глубина вместо времени")
+    parser.add_argument('--engines', type=int, default=None, help="Процессов Stockfish в пуле")
+    parser.add_argument('--threads', type=int, default=None, help="Потоков на один процесс Stockfish")
+    parser.add_argument('--win-cp', type=int, default=200, help="Порог выигрыша лучшей линии, сантипешки")
+    parser.add_argument('--margin-cp', type=int, default=150, help="Минимальный отрыв от второй линии, сантипешки")
+    args = parser.parse_args(argv)
+    import asyncio
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
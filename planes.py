@@ -0,0 +1,128 @@
+# Пакетное кодирование FEN в тензоры для датасетов: 12 плоскостей по 64 клетки
+# (KQRBNP белых, затем kqrbnp чёрных; клетка a1 = 0, как в board.py), очередь хода и права рокировки.
+# Расстановка каждого FEN разворачивается в 64 символа одним str.translate, дальше вся пачка
+# идёт в NumPy одним буфером: таблица подстановки даёт номер плоскости, единицы ставятся
+# одной индексной записью. Результат пишется в заранее выделенные массивы — в том числе в
+# .npy через open_memmap, по файлу на кусок, так что корпус любого размера не держится в памяти.
+# NumPy — необязательная зависимость, нужна только этому модулю.
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from readers import iter_fens
+
+PLANES = 'KQRBNPkqrbnp'
+CASTLING = 'KQkq'
+
+# '3' -> '...', '/' -> '': расстановка превращается ровно в 64 символа, от a8 до h1
+_EXPAND = str.maketrans({**{str(n): '.' * n for n in range(1, 9)}, '/': ''})
+
+_PLANE_INDEX = np.full(256, len(PLANES), dtype=np.uint8)
+for _plane, _piece in enumerate(PLANES):
+    _PLANE_INDEX[ord(_piece)] = _plane
+
+
+def allocate(count):
+    return {
+        'planes': np.zeros((count, len(PLANES), 64), dtype=np.uint8),
+        'side': np.zeros(count, dtype=np.uint8),
+        'castling': np.zeros((count, len(CASTLING)), dtype=np.uint8),
+    }
+
+
+def encode_batch(fens, out=None):
+    # fens — список FEN; out — словарь массивов (allocate или open_memmaps) не короче списка
+    count = len(fens)
+    if out is None:
+        out = allocate(count)
+    placements = []
+    sides = []
+    castlings = []
+    for fen in fens:
+        fields = fen.split(' ', 3)
+        placements.append(fields[0].translate(_EXPAND))
+        sides.append(fields[1] if len(fields) > 1 else 'w')
+        castlings.append(fields[2] if len(fields) > 2 else '-')
+
+    squares = ''.join(placements)
+    if len(squares) != 64 * count:
+        for index, placement in enumerate(placements):
+            if len(placement) != 64:
+                raise ValueError(f"FEN #{index}: расстановка не из 64 клеток: {fens[index]}")
+    # Строки FEN идут от восьмой горизонтали — разворачиваем, чтобы a1 была клеткой 0
+    codes = np.frombuffer(squares.encode('ascii'), dtype=np.uint8).reshape(count, 8, 8)[:, ::-1, :].reshape(count, 64)
+    plane_index = _PLANE_INDEX[codes]
+    rows, cols = np.nonzero(plane_index < len(PLANES))
+
+    planes = out['planes']
+    planes[:count] = 0
+    planes[rows, plane_index[rows, cols], cols] = 1
+
+    out['side'][:count] = np.frombuffer(''.join(sides).encode('ascii'), dtype=np.uint8) == ord('w')
+    castling = out['castling']
+    for column, right in enumerate(CASTLING):
+        castling[:count, column] = [right in rights for rights in castlings]
+    return out
+
+
+def open_chunk(prefix, index, count):
+    base = f"{prefix}-{index:05d}"
+    return {
+        'planes': np.lib.format.open_memmap(base + '.planes.npy', mode='w+', dtype=np.uint8,
+                                            shape=(count, len(PLANES), 64)),
+        'side': np.lib.format.open_memmap(base + '.side.npy', mode='w+', dtype=np.uint8, shape=(count,)),
+        'castling': np.lib.format.open_memmap(base + '.castling.npy', mode='w+', dtype=np.uint8,
+                                              shape=(count, len(CASTLING))),
+    }
+
+
+def write_chunks(fens, prefix, chunk_size=262144, batch_size=8192):
+    # Куски по chunk_size позиций, каждый — три .npy; кодируем пачками прямо в memmap
+    chunk = []
+    index = total = 0
+    for fen in fens:
+        chunk.append(fen)
+        if len(chunk) >= chunk_size:
+            _write_chunk(chunk, prefix, index, batch_size)
+            index += 1
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        _write_chunk(chunk, prefix, index, batch_size)
+        index += 1
+        total += len(chunk)
+    return total, index
+
+
+def _write_chunk(fens, prefix, index, batch_size):
+    out = open_chunk(prefix, index, len(fens))
+    for start in range(0, len(fens), batch_size):
+        batch = fens[start:start + batch_size]
+        encode_batch(batch, {name: array[start:start + len(batch)] for name, array in out.items()})
+    for array in out.values():
+        array.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FEN -> плоскости фигур, очередь хода и рокировки в .npy")
+    parser.add_argument('fens', help="Файл с FEN (первая колонка через табуляцию) или '-' для stdin")
+    parser.add_argument('--output', default='planes/positions', help="Префикс файлов: <префикс>-00000.planes.npy и т.д.")
+    parser.add_argument('--chunk', type=int, default=262144, help="Позиций в одном файле")
+    parser.add_argument('--batch', type=int, default=8192, help="Позиций в одной пачке кодирования")
+    args = parser.parse_args(argv)
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    t_start = time.time()
+    total, chunks = write_chunks(iter_fens(args.fens), args.output, args.chunk, args.batch)
+    elapsed = time.time() - t_start
+    print(f"Позиций: {total} в {chunks} файл(ах), время: {elapsed:.1f}s "
+          f"({total / elapsed * 60 if elapsed else 0:,.0f} позиций/мин)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# Индекс позиций на диске: хеш Zobrist -> смещение строки в корпусе.
+# Хеш-таблица с открытой адресацией (линейное пробирование) в одном файле, доступ через mmap:
+# проверка «уже есть» и поиск — O(1) без множества FEN-строк в памяти. Ключ 0 означает пустой слот.
+# Один хеш может стоять в нескольких слотах: при совпадении хешей сверяется сама строка корпуса.
+# В заголовке хранится размер корпуса, которому соответствует индекс, — по нему видно, что индекс устарел.
+# Перед первым изменением слотов размер в заголовке заменяется на DIRTY и возвращается только в commit:
+# оборванная посреди пачки запись не выдаст себя за индекс по обрезанному до чекпоинта корпусу.
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+from board import fen_zobrist
+from move_cache import normalize_fen
+
+MAGIC = b'CGZX'
+VERSION = 1
+MAX_LOAD = 0.7
+DIRTY = (1 << 64) - 1
+
+_HEADER = struct.Struct('<4sHHQQQ')  # magic, версия, резерв, число слотов, записей, размер корпуса
+_SLOT = struct.Struct('<QQ')  # хеш, смещение
+HEADER_SIZE = _HEADER.size
+SLOT_SIZE = _SLOT.size
+
+
+class PositionIndex:
+    def __init__(self, path, capacity=1 << 16):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER_SIZE:
+            self._create(path, capacity)
+        self.dirty = False
+        self._open()
+
+    @staticmethod
+    def _create(path, capacity):
+        # Число слотов — степень двойки, чтобы номер слота брать маской
+        capacity = 1 << max(4, (capacity - 1).bit_length())
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, 0, capacity, 0, 0))
+            f.truncate(HEADER_SIZE + capacity * SLOT_SIZE)
+
+    def _open(self):
+        self.file = open(self.path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, version, _, self.capacity, self.count, self.data_size = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path}: не индекс позиций или неподдерживаемая версия")
+        self.mask = self.capacity - 1
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def _slots(self, key):
+        # Слоты с этим ключом по пути пробирования, до первого пустого
+        slot = key & self.mask
+        while True:
+            stored, value = _SLOT.unpack_from(self.map, HEADER_SIZE + slot * SLOT_SIZE)
+            if stored == 0:
+                return
+            if stored == key:
+                yield value
+            slot = (slot + 1) & self.mask
+
+    def values(self, key):
+        return list(self._slots(key or 1))
+
+    def get(self, key):
+        return next(self._slots(key or 1), None)
+
+    def _mark_dirty(self):
+        if not self.dirty:
+            _HEADER.pack_into(self.map, 0, MAGIC, VERSION, 0, self.capacity, self.count, DIRTY)
+            self.map.flush()
+            self.dirty = True
+
+    def add(self, key, value):
+        # Запись без проверки на повтор: совпадение хеша ещё не значит ту же позицию (см. find)
+        key = key or 1
+        self._mark_dirty()
+        if (self.count + 1) > self.capacity * MAX_LOAD:
+            self._grow()
+        slot = key & self.mask
+        while _SLOT.unpack_from(self.map, HEADER_SIZE + slot * SLOT_SIZE)[0]:
+            slot = (slot + 1) & self.mask
+        _SLOT.pack_into(self.map, HEADER_SIZE + slot * SLOT_SIZE, key, value)
+        self.count += 1
+
+    def items(self):
+        for slot in range(self.capacity):
+            key, value = _SLOT.unpack_from(self.map, HEADER_SIZE + slot * SLOT_SIZE)
+            if key:
+                yield key, value
+
+    def _grow(self):
+        # Перестройка в файл вдвое больше и подмена старого
+        tmp_path = self.path + '.tmp'
+        self._create(tmp_path, self.capacity * 2)
+        bigger = PositionIndex(tmp_path)
+        for key, value in self.items():
+            bigger.add(key, value)
+        # Новый файл тоже помечен DIRTY, пока идёт пачка; размер корпуса вернёт commit
+        bigger.close()
+        data_size = self.data_size
+        self.map.close()
+        self.file.close()
+        os.replace(tmp_path, self.path)
+        self._open()
+        self.data_size = data_size
+
+    def commit(self, data_size):
+        # Индекс описывает ровно data_size байт корпуса: сначала слоты, потом заголовок
+        self.data_size = data_size
+        self.map.flush()
+        _HEADER.pack_into(self.map, 0, MAGIC, VERSION, 0, self.capacity, self.count, data_size)
+        self.map.flush()
+        self.dirty = False
+
+    def close(self):
+        # Незакоммиченная пачка остаётся помеченной DIRTY — при следующем открытии индекс перестроится
+        if self.map is not None:
+            if self.dirty:
+                _HEADER.pack_into(self.map, 0, MAGIC, VERSION, 0, self.capacity, self.count, DIRTY)
+            self.map.flush()
+            self.map.close()
+            self.map = None
+            self.file.close()
+
+
+def iter_corpus(path, start=0):
+    # (смещение строки, FEN) по файлу вида FEN<TAB>...
+    with open(path, 'rb') as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            fen = line.split(b'\t', 1)[0].strip()
+            if fen:
+                yield offset, fen.decode('ascii')
+            offset += len(line)
+
+
+def build_index(corpus_path, index_path):
+    # Индекс заново по всему корпусу
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    index = PositionIndex(index_path)
+    size = 0
+    if os.path.exists(corpus_path):
+        for offset, fen in iter_corpus(corpus_path):
+            index.add(fen_zobrist(fen), offset)
+        size = os.path.getsize(corpus_path)
+    index.commit(size)
+    return index
+
+
+def open_index(corpus_path, index_path=None):
+    # Индекс рядом с корпусом (<корпус>.idx); устаревший — перестраивается
+    index_path = index_path or corpus_path + '.idx'
+    size = os.path.getsize(corpus_path) if os.path.exists(corpus_path) else 0
+    if os.path.exists(index_path):
+        index = PositionIndex(index_path)
+        if index.data_size == size:
+            return index
+        index.close()
+    print(f"Строим индекс {index_path} по {corpus_path}", file=sys.stderr)
+    return build_index(corpus_path, index_path)
+
+
+def find(index, corpus, fen, key=None):
+    # Строка корпуса с этой позицией или None; corpus — файл, открытый на чтение в двоичном режиме
+    target = normalize_fen(fen)
+    for offset in index.values(fen_zobrist(fen) if key is None else key):
+        corpus.seek(offset)
+        line = corpus.readline().decode('utf-8').rstrip('\r\n')
+        if normalize_fen(line.split('\t', 1)[0]) == target:
+            return line
+    return None
+
+
+def lookup(corpus_path, index, fen):
+    with open(corpus_path, 'rb') as f:
+        return find(index, f, fen)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Поиск позиций в корпусе FEN по индексу хешей Zobrist")
+    parser.add_argument('corpus', help="Корпус: FEN<TAB>... на строку (например, corpus.tsv)")
+    parser.add_argument('fens', nargs='*', help="Позиции для поиска")
+    parser.add_argument('--rebuild', action='store_true', help="Перестроить индекс")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        index = build_index(args.corpus, args.corpus + '.idx')
+    else:
+        index = open_index(args.corpus)
+    try:
+        print(f"Позиций в индексе: {len(index)}, слотов: {index.capacity}", file=sys.stderr)
+        for fen in args.fens:
+            line = lookup(args.corpus, index, fen)
+            print(line if line is not None else f"{fen}\tнет в корпусе")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Офлайн-решатель базы задач lichess (lichess_db_puzzle.csv).
+# Файл читается построчно, задачи решаются пачками через пул движков,
+# после каждой пачки пишется чекпоинт — прерванный прогон продолжается с того же места.
+# Каждая посчитанная позиция дописывается в колоночное хранилище (results_store.py) для запросов по темам.
+import argparse
+import json
+import time
+
+from board import Position
+from checkpoint import load_checkpoint, save_checkpoint, truncate_output
+from metrics import metrics
+from readers import iter_chunks, iter_puzzles
+from settings import SETTING
+
+CHECKPOINT_DEFAULT = {'offset': 0, 'output_size': 0, 'store_rows': 0, 'done': 0, 'solved': 0, 'time': 0.0}
+
+
+async def solve_puzzle(engines, puzzle, think_time):
+    # Первый ход в Moves — ход соперника, после него решаем каждый свой ход по очереди
+    moves = puzzle['Moves'].split()
+    found = 0
+    from_tablebase = 0
+    total = len(moves[1::2])
+    rating = int(puzzle.get('Rating') or 0)
+    # Строки для хранилища результатов: по одной на каждый вызов движка
+    steps = []
+    error = None
+    # Считаем только время движка, без ожидания свободного процесса в пуле
+    spent = 0.0
+    try:
+        position = Position.from_fen(puzzle['FEN'])
+        position.push_uci(moves[0])
+        for i in range(1, len(moves), 2):
+            result = await engines.analyse(position.fen(), think_time)
+            spent += result['time']
+            if result.get('error'):
+                # Позицию отверг проверяющий FEN, до движка дело не дошло — это ошибка задачи, а не промах
+                error = result['error']
+                print(f"Ошибка в задаче {puzzle['PuzzleId']}: {error}")
+                break
+            from_tablebase += bool(result.get('tablebase'))
+            steps.append({'hash': position.zobrist, 'move': result['move'], 'score': result.get('score'),
+                          'mate': result.get('mate'), 'depth': result.get('depth'), 'time': result['time'],
+                          'correct': result['move'] == moves[i], 'rating': rating})
+            if result['move'] != moves[i]:
+                break
+            found += 1
+            position.push_uci(moves[i])
+            if i + 1 < len(moves):
+                position.push_uci(moves[i + 1])
+    except (ValueError, KeyError, IndexError) as e:
+        error = str(e)
+        print(f"Ошибка в задаче {puzzle['PuzzleId']}: {e}")
+    return {
+        'id': puzzle['PuzzleId'],
+        'rating': rating,
+        'themes': puzzle.get('Themes', ''),
+        'solved': found == total,
+        'moves_found': found,
+        'moves_total': total,
+        'time': round(spent, 4),
+        'tablebase': from_tablebase,
+        'error': error,
+        'steps': steps,
+    }
+
+
+async def run(args):
+    import asyncio
+    state = load_checkpoint(args.checkpoint, CHECKPOINT_DEFAULT)
+    if state['done']:
+        print(f"Продолжаем с задачи {state['done']} (смещение {state['offset']})")
+
+    truncate_output(args.output, state['output_size'])
+    store = None
+    if args.store:
+        from results_store import ResultStore
+        store = ResultStore(args.store)
+        store.truncate(state['store_rows'])
+
+    # Пул движков, кэш и таблицы нужны только самому прогону, не --help и не импорту модуля
+    from engine_pool import EnginePool
+    from move_cache import MoveCache
+    from tablebase import open_tablebase
+
+    cache = MoveCache(args.cache, SETTING.cache_size) if args.cache else None
+    tablebase = open_tablebase(args.syzygy)
+    engines = EnginePool(size=args.engines, threads=args.threads, cache=cache, tablebase=tablebase)
+    t_start = time.time()
+    started = state['done']
+    try:
+        with open(args.output, 'a', encoding='utf-8') as out:
+            puzzles = iter_puzzles(args.csv, state['offset'])
+            for chunk in iter_chunks(puzzles, args.chunk):
+                if args.limit and state['done'] >= args.limit:
+                    break
+                if args.limit:
+                    chunk = chunk[:args.limit - state['done']]
+                metrics.incr('puzzles', len(chunk))
+                results = await asyncio.gather(*(solve_puzzle(engines, puzzle, args.think_time) for puzzle, _ in chunk))
+                for result in results:
+                    steps = result.pop('steps')
+                    if store is not None:
+                        themes = result['themes'].split()
+                        for step in steps:
+                            store.append(step, themes)
+                    out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    state['solved'] += result['solved']
+                    state['time'] += result['time']
+                out.flush()
+                state['done'] += len(results)
+                state['offset'] = chunk[-1][1]
+                state['output_size'] = out.tell()
+                if store is not None:
+                    state['store_rows'] = store.flush()
+                if args.checkpoint:
+                    save_checkpoint(args.checkpoint, state)
+                print(f"Решено {state['solved']}/{state['done']} ({state['solved'] / state['done']:.1%}), "
+                      f"среднее время: {state['time'] / state['done']:.3f}s")
+    finally:
+        engines.close()
+        if store is not None:
+            store.close()
+
+    done = state['done'] - started
+    elapsed = time.time() - t_start
+    if cache is not None:
+        print(f"Кэш ходов: {cache.stats()}")
+    if tablebase is not None:
+        state['tablebase'] = tablebase.stats()
+        print(f"Таблицы Syzygy: {state['tablebase']}")
+    if metrics.enabled and args.metrics:
+        metrics.export(args.metrics)
+    if state['done']:
+        print(f"Итого: точность {state['solved'] / state['done']:.1%}, "
+              f"среднее время решения {state['time'] / state['done']:.3f}s, "
+              f"за прогон {done} задач за {elapsed:.1f}s")
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Решение базы задач lichess через пул Stockfish")
+    parser.add_argument('csv', help="Путь к lichess_db_puzzle.csv")
+    parser.add_argument('--output', default='puzzle_results.jsonl', help="Файл результатов (JSON Lines)")
+    parser.add_argument('--checkpoint', default='puzzle_results.ckpt', help="Файл чекпоинта; пустая строка — без чекпоинтов")
+    parser.add_argument('--think-time', type=int, default=SETTING.thinking_time, help="Время на ход, мс")
+    parser.add_argument('--engines', type=int, default=None, help="Процессов Stockfish в пуле")
+    parser.add_argument('--threads', type=int, default=None, help="Потоков на один процесс Stockfish")
+    parser.add_argument('--cache', default=SETTING.cache_path, help="Файл кэша ходов SQLite; пустая строка — без кэша")
+    parser.add_argument('--syzygy', default=SETTING.syzygy_path,
+                        help="Каталоги с таблицами Syzygy через os.pathsep (нужен python-chess)")
+    parser.add_argument('--store', default='puzzle_results.store',
+                        help="Каталог колоночного хранилища по позициям; пустая строка — без него")
+    parser.add_argument('--metrics', default=SETTING.metrics_path, help="Куда выгрузить метрики (.jsonl или .prom)")
+    parser.add_argument('--chunk', type=int, default=256, help="Задач в одной пачке между чекпоинтами")
+    parser.add_argument('--limit', type=int, default=0, help="Остановиться после N задач (0 — без ограничения)")
+    args = parser.parse_args(argv)
+    # asyncio — около 75 мс запуска, нужен только самому прогону, не --help и не импорту модуля
+    import asyncio
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
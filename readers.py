@@ -0,0 +1,47 @@
+# Потоковое чтение входных файлов офлайн-инструментов: FEN построчно и задачи lichess_db_puzzle.csv.
+# Только stdlib — модуль импортируют и утилиты, которым не нужны ни NumPy, ни asyncio, ни движок.
+import csv
+import sys
+
+CSV_FIELDS = ['PuzzleId', 'FEN', 'Moves', 'Rating', 'RatingDeviation', 'Popularity',
+              'NbPlays', 'Themes', 'GameUrl', 'OpeningTags']
+
+
+def iter_fens(path):
+    # FEN в первой колонке через табуляцию — подходят corpus.tsv и вывод snapshot.py; '-' — stdin
+    with (sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')) as f:
+        for line in f:
+            fen = line.split('\t', 1)[0].strip()
+            if fen and not fen.startswith('#'):
+                yield fen
+
+
+def iter_puzzles(path, offset=0):
+    # Отдаёт (задача, смещение следующей строки); в памяти только текущая строка
+    with open(path, 'rb') as f:
+        if offset:
+            f.seek(offset)
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            offset = f.tell()
+            text = line.decode('utf-8').rstrip('\r\n')
+            if not text or text.startswith('PuzzleId'):
+                continue
+            row = next(csv.reader((text,)))
+            puzzle = dict(zip(CSV_FIELDS, row))
+            if 'FEN' not in puzzle or 'Moves' not in puzzle:
+                continue
+            yield puzzle, offset
+
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
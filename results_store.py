@@ -0,0 +1,259 @@
+# Колоночное хранилище результатов пакетных прогонов: строка — одна позиция, посчитанная движком.
+# Каждая колонка — отдельный файл с плотным массивом (модуль array), строки дописываются в конец.
+# Ходы и темы хранятся номерами в словарях из meta.json. Вторичные индексы — списки номеров
+# строк на каждую тему и на каждый диапазон рейтинга (band-<N>.rows), так что «точность и
+# медианное время по темам» считается по готовым колонкам, без повторного чтения CSV и JSONL.
+# Запись — только stdlib (array); запросы читают колонки в NumPy и считают все группы за раз: строки групп
+# склеиваются в один массив, верные ответы суммирует np.add.reduceat, медиана времени — np.median по куску
+# каждой группы. NumPy нужен только запросам.
+# meta.json пишется последним: в нём число строк, всё, что за ним в файлах, — недописанный хвост.
+# Хвост отрезает только пишущий (truncate при продолжении прогона); открытие и запросы файлы не меняют,
+# так что запрос можно запускать прямо во время прогона — строки за meta.json он просто не видит.
+import argparse
+import bisect
+import json
+import os
+import sys
+from array import array
+
+from checkpoint import load_checkpoint, save_checkpoint
+
+VERSION = 1
+BAND_WIDTH = 200
+NO_SCORE = -(1 << 31)
+
+# Имя колонки и тип элемента array
+COLUMNS = [
+    ('hash', 'Q'),      # хеш Zobrist позиции
+    ('move', 'H'),      # ход движка, номер в словаре moves
+    ('score', 'i'),     # оценка в сантипешках, NO_SCORE — нет (мат или кэш)
+    ('mate', 'h'),      # мат в N ходов, 0 — нет
+    ('depth', 'H'),     # достигнутая глубина, 0 — неизвестна
+    ('time', 'f'),      # время движка, с
+    ('correct', 'B'),   # 1 — ход совпал с решением
+    ('rating', 'H'),    # рейтинг задачи
+]
+TYPECODES = dict(COLUMNS)
+
+
+def _read_array(path, typecode, count=None):
+    values = array(typecode)
+    if os.path.exists(path):
+        size = os.path.getsize(path) // values.itemsize
+        with open(path, 'rb') as f:
+            values.fromfile(f, size if count is None else min(size, count))
+    return values
+
+
+class ResultStore:
+    def __init__(self, path, band_width=BAND_WIDTH):
+        self.path = path
+        self.meta = load_checkpoint(os.path.join(path, 'meta.json'), {
+            'version': VERSION, 'rows': 0, 'band_width': band_width, 'moves': [], 'themes': [],
+        })
+        if self.meta['version'] != VERSION:
+            raise ValueError(f"{path}: неподдерживаемая версия хранилища {self.meta['version']}")
+        self.band_width = self.meta['band_width']
+        self.move_ids = {move: i for i, move in enumerate(self.meta['moves'])}
+        self.theme_ids = {theme: i for i, theme in enumerate(self.meta['themes'])}
+        # Несброшенные строки и номера строк для индексов
+        self.pending = {name: array(typecode) for name, typecode in COLUMNS}
+        self.pending_postings = {}
+        self.columns = {}
+
+    def __len__(self):
+        return self.meta['rows'] + len(self.pending['hash'])
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _posting_files(self):
+        if not os.path.isdir(self.path):
+            return []
+        return [name for name in os.listdir(self.path) if name.endswith('.rows')]
+
+    def truncate(self, rows):
+        # Отрезаем всё после rows строк: хвост прерванного прогона или строки после чекпоинта.
+        # Только для пишущего: параллельный запрос иначе отрезал бы строки, которые ещё не попали в meta.json
+        os.makedirs(self.path, exist_ok=True)
+        for name, typecode in COLUMNS:
+            path = self._file(name + '.col')
+            with open(path, 'ab') as f:
+                f.truncate(rows * array(typecode).itemsize)
+        for name in self._posting_files():
+            path = self._file(name)
+            postings = _read_array(path, 'I')
+            keep = bisect.bisect_left(postings, rows)
+            if keep < len(postings):
+                with open(path, 'ab') as f:
+                    f.truncate(keep * postings.itemsize)
+        if rows != self.meta['rows']:
+            self.meta['rows'] = rows
+            save_checkpoint(self._file('meta.json'), self.meta)
+        self.columns = {}
+
+    def _encode(self, ids, names, value):
+        if value not in ids:
+            ids[value] = len(names)
+            names.append(value)
+        return ids[value]
+
+    def band(self, rating):
+        return rating // self.band_width * self.band_width
+
+    def append(self, fields, themes=()):
+        # fields — hash, move, score, mate, depth, time, correct, rating; None допустимо в score/mate/depth/move
+        row = len(self)
+        pending = self.pending
+        pending['hash'].append(fields['hash'])
+        pending['move'].append(self._encode(self.move_ids, self.meta['moves'], fields.get('move') or ''))
+        pending['score'].append(NO_SCORE if fields.get('score') is None else fields['score'])
+        pending['mate'].append(fields.get('mate') or 0)
+        pending['depth'].append(fields.get('depth') or 0)
+        pending['time'].append(fields['time'])
+        pending['correct'].append(bool(fields['correct']))
+        rating = fields.get('rating') or 0
+        pending['rating'].append(rating)
+        keys = [f"band-{self.band(rating)}"]
+        keys += [f"theme-{self._encode(self.theme_ids, self.meta['themes'], theme)}" for theme in themes]
+        for key in keys:
+            self.pending_postings.setdefault(key, array('I')).append(row)
+        return row
+
+    def flush(self):
+        # Дописываем колонки и индексы, потом фиксируем число строк в meta.json
+        added = len(self.pending['hash'])
+        if not added:
+            return self.meta['rows']
+        os.makedirs(self.path, exist_ok=True)
+        for name, values in self.pending.items():
+            with open(self._file(name + '.col'), 'ab') as f:
+                values.tofile(f)
+        for key, rows in self.pending_postings.items():
+            with open(self._file(key + '.rows'), 'ab') as f:
+                rows.tofile(f)
+        self.meta['rows'] += added
+        save_checkpoint(self._file('meta.json'), self.meta)
+        self.pending = {name: array(typecode) for name, typecode in COLUMNS}
+        self.pending_postings = {}
+        self.columns = {}
+        return self.meta['rows']
+
+    def close(self):
+        self.flush()
+
+    # Запросы — только по сброшенным строкам; numpy импортируется здесь, чтобы запись без него работала
+
+    def column(self, name):
+        import numpy as np
+        if name not in self.columns:
+            path = self._file(name + '.col')
+            self.columns[name] = np.fromfile(path, dtype=TYPECODES[name], count=self.meta['rows']) \
+                if self.meta['rows'] else np.zeros(0, dtype=TYPECODES[name])
+        return self.columns[name]
+
+    def _postings(self, name):
+        import numpy as np
+        path = self._file(name + '.rows')
+        if not os.path.exists(path):
+            return np.zeros(0, dtype='I')
+        postings = np.fromfile(path, dtype='I')
+        # Номера строк отсортированы; всё от meta['rows'] — строки, которые пишущий ещё не зафиксировал
+        return postings[:np.searchsorted(postings, self.meta['rows'])]
+
+    def rows(self, theme=None, band=None):
+        # Номера строк по индексам (отсортированы); None — без условия
+        import numpy as np
+        selected = None
+        if theme is not None:
+            if theme not in self.theme_ids:
+                return np.zeros(0, dtype='I')
+            selected = self._postings(f"theme-{self.theme_ids[theme]}")
+        if band is not None:
+            by_band = self._postings(f"band-{self.band(band)}")
+            selected = by_band if selected is None else np.intersect1d(selected, by_band, assume_unique=True)
+        if selected is None:
+            return np.arange(self.meta['rows'], dtype='I')
+        return selected
+
+    def summary(self, rows):
+        return next(iter(self._grouped([None], [rows]).values()))
+
+    def _grouped(self, keys, row_lists):
+        # Точность и медиана времени сразу для всех групп: строки групп склеиваются в один массив,
+        # каждая группа — непрерывный кусок; сумма верных — add.reduceat, медиана — np.median (partition) по куску
+        import numpy as np
+        lengths = [len(rows) for rows in row_lists]
+        rows = np.concatenate(row_lists) if row_lists else np.zeros(0, dtype='I')
+        times = self.column('time')[rows]
+        correct = self.column('correct')[rows].astype(np.int64)
+        starts = np.cumsum([0] + lengths[:-1]).astype(np.int64)
+        nonempty = [start for start, count in zip(starts.tolist(), lengths) if count]
+        hits = iter(np.add.reduceat(correct, nonempty).tolist() if nonempty else [])
+        result = {}
+        for key, start, count in zip(keys, starts.tolist(), lengths):
+            if not count:
+                result[key] = {'positions': 0, 'accuracy': 0.0, 'median_time': None}
+                continue
+            result[key] = {
+                'positions': count,
+                'accuracy': round(next(hits) / count, 4),
+                'median_time': round(float(np.median(times[start:start + count])), 4),
+            }
+        return result
+
+    def _in_band(self, band):
+        return (self.column('rating') // self.band_width * self.band_width) == self.band(band)
+
+    def by_theme(self, band=None):
+        themes = self.meta['themes']
+        row_lists = [self._postings(f"theme-{theme_id}") for theme_id in range(len(themes))]
+        if band is not None:
+            # Условие по рейтингу — маской по колонке, без пересечения индексов для каждой темы
+            in_band = self._in_band(band)
+            row_lists = [rows[in_band[rows]] for rows in row_lists]
+        return self._grouped(themes, row_lists)
+
+    def by_band(self, theme=None):
+        import numpy as np
+        bands = sorted(int(name[len('band-'):-len('.rows')]) for name in self._posting_files()
+                       if name.startswith('band-'))
+        row_lists = [self._postings(f"band-{band}") for band in bands]
+        if theme is not None:
+            with_theme = np.zeros(self.meta['rows'], dtype=bool)
+            with_theme[self.rows(theme)] = True
+            row_lists = [rows[with_theme[rows]] for rows in row_lists]
+        return self._grouped(bands, row_lists)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Точность и медианное время по темам и рейтингу из хранилища результатов")
+    parser.add_argument('store', help="Каталог хранилища (puzzle_solver.py --store)")
+    parser.add_argument('--by', choices=['theme', 'band'], default='theme', help="Группировка")
+    parser.add_argument('--theme', default=None, help="Только задачи с этой темой")
+    parser.add_argument('--band', type=int, default=None, help="Только этот диапазон рейтинга (любой рейтинг из него)")
+    parser.add_argument('--min-positions', type=int, default=1, help="Не показывать группы меньше")
+    parser.add_argument('--json', action='store_true', help="Вывод в JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(os.path.join(args.store, 'meta.json')):
+        print(f"{args.store}: хранилище не найдено", file=sys.stderr)
+        return
+    store = ResultStore(args.store)
+    if args.by == 'theme':
+        groups = store.by_theme(args.band)
+    else:
+        groups = store.by_band(args.theme)
+    groups = {key: value for key, value in groups.items() if value['positions'] >= args.min_positions}
+    if args.json:
+        json.dump(groups, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    print(f"Позиций в хранилище: {len(store)}")
+    for key, value in sorted(groups.items(), key=lambda item: -item[1]['positions']):
+        median = f"{value['median_time'] * 1000:.0f} мс" if value['median_time'] is not None else '-'
+        print(f"{key!s:<24} {value['positions']:>9}  точность {value['accuracy']:6.1%}  медиана {median}")
+
+
+if __name__ == "__main__":
+    main()
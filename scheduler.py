@@ -0,0 +1,258 @@
+# Адаптивное распределение времени движка при пакетном решении задач.
+# Каждая позиция сначала получает дешёвый пробный поиск на малую глубину: если мат уже найден —
+# ход готов, если лучший ход скакал по глубинам — позиция трудная и получает больше времени.
+# Основной поиск идёт с потоковым чтением info и останавливается досрочно, когда найден мат
+# или лучший ход держится несколько итераций подряд. Сэкономленное время копится в «банке»
+# и уходит трудным позициям. Для сравнения можно прогнать те же задачи с фиксированным временем.
+import argparse
+import json
+import time
+
+from board import Position
+from readers import iter_puzzles
+from settings import SETTING
+
+
+class TimeBank:
+    # На каждую позицию в банк кладётся average_ms; простые позиции тратят меньше,
+    # остаток достаётся трудным, но не больше max_factor средних за раз
+    def __init__(self, average_ms, max_factor=4):
+        self.average_ms = average_ms
+        self.max_factor = max_factor
+        self.balance = 0.0
+
+    def deposit(self):
+        self.balance += self.average_ms
+
+    def allocate(self, weight):
+        surplus = max(0.0, self.balance - self.average_ms)
+        wanted = self.average_ms * weight + (surplus / 2 if weight > 1 else 0)
+        return int(max(1, min(wanted, self.balance, self.average_ms * self.max_factor)))
+
+    def spend(self, ms):
+        self.balance -= ms
+
+
+def best_move_changes(history):
+    # Сколько раз менялся лучший ход во второй половине пробного поиска
+    moves = [move for _, move in history[len(history) // 2:]]
+    return sum(1 for previous, move in zip(moves, moves[1:]) if previous != move)
+
+
+def difficulty_weight(probe, history):
+    if probe['mate'] is not None and probe['mate'] > 0:
+        return 0.0
+    changes = best_move_changes(history)
+    if changes >= 2:
+        return 2.0
+    if changes == 0 and abs(probe['score'] or 0) >= 300:
+        return 0.5
+    return 1.0
+
+
+async def _iterations(search, on_depth):
+    # Отдаёт управление on_depth(depth, info) на каждой новой глубине; True — остановить поиск
+    depth = 0
+    async for info in search:
+        if 'bound' in info or info.get('multipv', 1) != 1:
+            continue
+        if info.get('depth', 0) > depth:
+            depth = info['depth']
+            if on_depth(depth, info):
+                # Мат в нашу пользу — 'mate'; проигранная позиция останавливается только по стабильности хода
+                mate = info['mate'] is not None and info['mate'] > 0
+                return await search.stop(), 'mate' if mate else 'converged'
+    return search.result(), 'budget'
+
+
+async def adaptive_search(engine, fen, bank, args):
+    bank.deposit()
+    history = []
+
+    def record(depth, info):
+        history.append((depth, info['pv'][0]))
+        return False
+
+    search = await engine.go(fen, depth=args.probe_depth)
+    probe, _ = await _iterations(search, record)
+    spent = probe['time'] * 1000
+    weight = difficulty_weight(probe, history)
+    if weight == 0.0 or not probe['move']:
+        # Нет хода (мат или пат на доске) — отдельная причина, чтобы не смешивать с найденным матом
+        bank.spend(spent)
+        return dict(probe, reason='probe_mate' if probe['move'] else 'no_move', weight=weight, time=probe['time'])
+
+    allocation = bank.allocate(weight)
+    state = {'move': None, 'stable': 0}
+
+    def converged(depth, info):
+        if info['mate'] is not None and info['mate'] > 0:
+            return True
+        move = info['pv'][0]
+        state['stable'] = state['stable'] + 1 if move == state['move'] else 1
+        state['move'] = move
+        return depth >= args.min_depth and state['stable'] >= args.stable
+
+    search = await engine.go(fen, movetime=allocation)
+    result, reason = await _iterations(search, converged)
+    spent += result['time'] * 1000
+    bank.spend(spent)
+    return dict(result, reason=reason, weight=weight, allocation=allocation, time=spent / 1000)
+
+
+async def fixed_search(engine, fen, args):
+    return dict(await (await engine.go(fen, movetime=args.think_time)).wait(), reason='fixed')
+
+
+async def solve(engines, puzzle, search):
+    # Как solve_puzzle, но с произвольной стратегией поиска и учётом причин остановки
+    moves = puzzle['Moves'].split()
+    total = len(moves[1::2])
+    found = 0
+    spent = 0.0
+    reasons = {}
+    error = None
+    engine = await engines.get()
+    try:
+        position = Position.from_fen(puzzle['FEN'])
+        position.push_uci(moves[0])
+        for i in range(1, len(moves), 2):
+            result = await search(engine, position.fen())
+            spent += result['time']
+            reasons[result['reason']] = reasons.get(result['reason'], 0) + 1
+            if result['move'] != moves[i]:
+                break
+            found += 1
+            position.push_uci(moves[i])
+            if i + 1 < len(moves):
+                position.push_uci(moves[i + 1])
+    except (ValueError, KeyError, IndexError) as e:
+        print(f"Ошибка в задаче {puzzle['PuzzleId']}: {e}")
+    except (RuntimeError, ConnectionError) as e:
+        # Упал процесс движка: задача считается нерешённой, движок перезапускаем, остальные задачи идут дальше
+        error = str(e)
+        print(f"Движок упал на задаче {puzzle['PuzzleId']}: {e}")
+        engine = await restart(engine)
+    finally:
+        engines.put_nowait(engine)
+    return {
+        'id': puzzle['PuzzleId'],
+        'rating': int(puzzle.get('Rating') or 0),
+        'solved': found == total,
+        'moves_found': found,
+        'moves_total': total,
+        'time': round(spent, 4),
+        'reasons': reasons,
+        'error': error,
+    }
+
+
+async def restart(engine):
+    # Новый процесс с теми же настройками; если и он не поднялся, следующие задачи на нём тоже упадут
+    import asyncio
+    engine.search = None
+    try:
+        await engine.quit()
+    except OSError:
+        pass
+    try:
+        await engine.start()
+    except (OSError, RuntimeError, ConnectionError, asyncio.TimeoutError) as e:
+        print(f"Не удалось перезапустить движок: {e}")
+    return engine
+
+
+async def new_game(engines):
+    # Перед каждым режимом чистим хеш, чтобы второй прогон не пользовался найденным в первом
+    idle = [engines.get_nowait() for _ in range(engines.qsize())]
+    for engine in idle:
+        await engine.new_game()
+        engines.put_nowait(engine)
+
+
+async def run_mode(name, engines, puzzles, search, args, out=None):
+    import asyncio
+    await new_game(engines)
+    results = await asyncio.gather(*(solve(engines, puzzle, search) for puzzle in puzzles))
+    solved = sum(result['solved'] for result in results)
+    errors = sum(1 for result in results if result['error'])
+    engine_seconds = sum(result['time'] for result in results)
+    cpu_seconds = engine_seconds * args.threads
+    reasons = {}
+    for result in results:
+        if out is not None:
+            out.write(json.dumps(dict(result, mode=name), ensure_ascii=False) + '\n')
+        for reason, count in result['reasons'].items():
+            reasons[reason] = reasons.get(reason, 0) + count
+    summary = {
+        'mode': name,
+        'puzzles': len(results),
+        'solved': solved,
+        'accuracy': round(solved / len(results), 4) if results else 0.0,
+        'cpu_seconds': round(cpu_seconds, 2),
+        'solved_per_cpu_second': round(solved / cpu_seconds, 4) if cpu_seconds else 0.0,
+        'stops': reasons,
+        'engine_errors': errors,
+    }
+    print(f"{name}: решено {solved}/{len(results)}, CPU {cpu_seconds:.1f}s, "
+          f"решений на CPU-секунду {summary['solved_per_cpu_second']}, остановки {reasons}"
+          + (f", падений движка {errors}" if errors else ''))
+    return summary
+
+
+async def run(args):
+    import asyncio
+    from uci import open_engine
+    puzzles = []
+    for puzzle, _ in iter_puzzles(args.csv):
+        puzzles.append(puzzle)
+        if len(puzzles) >= args.limit:
+            break
+
+    engines = asyncio.Queue()
+    for _ in range(args.engines):
+        engines.put_nowait(await open_engine(threads=args.threads, hash_size=args.hash))
+    bank = TimeBank(args.think_time, args.max_factor)
+    t_start = time.time()
+    summaries = []
+    try:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            summaries.append(await run_mode(
+                'adaptive', engines, puzzles, lambda engine, fen: adaptive_search(engine, fen, bank, args), args, out))
+            if args.baseline:
+                summaries.append(await run_mode(
+                    'fixed', engines, puzzles, lambda engine, fen: fixed_search(engine, fen, args), args, out))
+    finally:
+        while not engines.empty():
+            await engines.get_nowait().quit()
+
+    if len(summaries) == 2 and summaries[1]['solved_per_cpu_second']:
+        ratio = summaries[0]['solved_per_cpu_second'] / summaries[1]['solved_per_cpu_second']
+        print(f"Адаптивный режим: x{ratio:.2f} решений на CPU-секунду к фиксированным {args.think_time} мс")
+    print(f"Время прогона: {(time.time() - t_start):.1f}s")
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Решение задач с адаптивным распределением времени движка")
+    parser.add_argument('csv', help="Путь к lichess_db_puzzle.csv")
+    parser.add_argument('--output', default='scheduler_results.jsonl', help="Результаты по задачам (JSON Lines)")
+    parser.add_argument('--limit', type=int, default=500, help="Сколько задач взять из начала файла")
+    parser.add_argument('--think-time', type=int, default=SETTING.thinking_time,
+                        help="Среднее время на позицию, мс (оно же время фиксированного режима)")
+    parser.add_argument('--max-factor', type=float, default=4, help="Максимум времени на позицию, в средних")
+    parser.add_argument('--probe-depth', type=int, default=8, help="Глубина пробного поиска")
+    parser.add_argument('--min-depth', type=int, default=12, help="Раньше этой глубины поиск не останавливается")
+    parser.add_argument('--stable', type=int, default=4, help="Глубин подряд с тем же лучшим ходом для остановки")
+    parser.add_argument('--engines', type=int, default=1, help="Процессов Stockfish")
+    parser.add_argument('--threads', type=int, default=SETTING.threads, help="Потоков на один процесс Stockfish")
+    parser.add_argument('--hash', type=int, default=SETTING.hash_size, help="Hash на процесс, МБ")
+    parser.add_argument('--baseline', action='store_true', help="Прогнать те же задачи с фиксированным временем")
+    args = parser.parse_args(argv)
+    # asyncio и UCI-клиент импортируются только для прогона — --help и импорт модуля их не ждут
+    import asyncio
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
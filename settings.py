@@ -0,0 +1,90 @@
+import json
+import os
+
+# Файл с переопределениями (например, результат tune.py); значения из него заменяют константы ниже.
+# Поверх файла — переменные окружения CHESS_BOT_<ИМЯ> (CHESS_BOT_THREADS=2) и STOCKFISH_PATH
+CONFIG_PATH = os.environ.get('CHESS_BOT_CONFIG') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'settings.json')
+
+
+class SETTING:
+    thinking_time = 900
+    threads = 8 # Количество задействованных ядер Stockfish'ом
+    puzzle_mode = True
+    depth = None # Можно задать глубину
+    stockfish_path = "C:/Program Files (x86)/stockfish/stockfish.exe"
+    hash_size = 128 # МБ на один процесс движка
+    engines = None # Процессов в пуле движков; None — по числу ядер / threads
+    cache_path = "move_cache.sqlite" # Кэш лучших ходов на диске; None — только в памяти
+    cache_size = 64 # МБ под кэш ходов в памяти
+    metrics = True # Сбор метрик (интервалы и счётчики); False — заглушки без накладных расходов
+    metrics_path = "metrics.jsonl" # Куда выгружать метрики; *.prom — в формате Prometheus
+    snapshot_log = "snapshots.bin" # Журнал снимков доски (80 байт на снимок); None — не писать
+    syzygy_path = None # Каталоги с таблицами Syzygy через os.pathsep; нужен python-chess
+
+
+def load_config(path=CONFIG_PATH):
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Не удалось прочитать настройки {path}: {e}")
+        return {}
+    for name, value in config.items():
+        if name.startswith('_'):
+            # Служебные поля (например, _tuned с результатами подбора)
+            continue
+        if not hasattr(SETTING, name):
+            print(f"Неизвестная настройка {name} в {path}, пропускаем")
+            continue
+        setattr(SETTING, name, value)
+    return config
+
+
+def load_env(environ=None):
+    environ = os.environ if environ is None else environ
+    overrides = {}
+    for name in vars(SETTING):
+        if name.startswith('_'):
+            continue
+        value = environ.get('CHESS_BOT_' + name.upper())
+        if value is None:
+            continue
+        # Числа, true/false и null — как в JSON, остальное строкой
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        overrides[name] = value
+    if environ.get('STOCKFISH_PATH'):
+        overrides['stockfish_path'] = environ['STOCKFISH_PATH']
+    for name, value in overrides.items():
+        setattr(SETTING, name, value)
+    return overrides
+
+
+def stockfish_path():
+    # Путь по умолчанию — виндовый; если файла там нет, ищем stockfish в PATH
+    if os.path.exists(SETTING.stockfish_path):
+        return SETTING.stockfish_path
+    import shutil
+    return shutil.which('stockfish') or SETTING.stockfish_path
+
+
+def save_config(values, path=CONFIG_PATH):
+    # Дописываем к уже сохранённым переопределениям; запись через временный файл
+    config = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    config.update(values)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return config
+
+
+load_config()
+load_env()
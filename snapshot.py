@@ -0,0 +1,161 @@
+# Офлайн-разбор сохранённых страниц (failed_position.html) в FEN без Playwright.
+# Вместо page.evaluate HTML читается кусками и разбирается регулярками,
+# чтение прекращается сразу после </cg-board>.
+import argparse
+import os
+import re
+import sys
+import time
+
+from board import PIECES, SQUARE_INDEX, Board
+from fen_builder import build_fen, transform_table
+from metrics import metrics
+from tracker import PositionTracker
+
+DEFAULT_BOARD_WIDTH = 436.0
+CHUNK_SIZE = 64 * 1024
+
+_WRAP_RE = re.compile(r'class="([^"]*\bcg-wrap\b[^"]*)"')
+_CONTAINER_RE = re.compile(r'<cg-container\b[^>]*?style="[^"]*?\bwidth:\s*([\d.]+)px')
+_TAG_RE = re.compile(r'<(piece|square)\b([^>]*)>')
+_CLASS_RE = re.compile(r'\bclass="([^"]*)"')
+_TRANSLATE_RE = re.compile(r'translate\([^)]*\)')
+
+
+def _tokenize_board(board_html):
+    pieces = []
+    last_moves = []
+    for tag, attrs in _TAG_RE.findall(board_html):
+        class_match = _CLASS_RE.search(attrs)
+        class_name = class_match.group(1) if class_match else ''
+        translate = _TRANSLATE_RE.search(attrs)
+        transform = translate.group(0) if translate else ''
+        if tag == 'piece':
+            pieces.append({'class': class_name, 'transform': transform})
+        elif 'last-move' in class_name.split():
+            last_moves.append(transform)
+    return pieces, last_moves
+
+
+def parse_snapshot(html, board_width=None):
+    start = html.find('<cg-board')
+    if start < 0:
+        return None
+    end = html.find('</cg-board>', start)
+    if end < 0:
+        end = len(html)
+
+    head = html[:start]
+    orientation = 'white'
+    for classes in _WRAP_RE.findall(head):
+        if 'orientation-black' in classes.split():
+            orientation = 'black'
+
+    if board_width is None:
+        container = _CONTAINER_RE.search(head)
+        board_width = float(container.group(1)) if container else DEFAULT_BOARD_WIDTH
+
+    with metrics.span('snapshot_tokenize'):
+        pieces, last_moves = _tokenize_board(html[start:end])
+    return {
+        'orientation': orientation,
+        'board_width': board_width,
+        'pieces': pieces,
+        'last_moves': last_moves,
+    }
+
+
+def read_snapshot(path, board_width=None):
+    # Читаем файл кусками, пока не встретим конец доски — остаток страницы не нужен
+    parts = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            parts.append(chunk)
+            # Тег может оказаться разрезан между кусками, поэтому проверяем хвост вместе с предыдущим куском
+            tail = ''.join(parts[-2:])
+            if '</cg-board>' in tail:
+                break
+    return parse_snapshot(''.join(parts), board_width)
+
+
+def snapshot_to_fen(snapshot, verbose=False):
+    square_size = snapshot['board_width'] / 8
+    return build_fen(snapshot['pieces'], snapshot['last_moves'], square_size, snapshot['orientation'], verbose)
+
+
+PIECE_CLASSES = {
+    letter: f"{'white' if letter.isupper() else 'black'} {name}"
+    for letter, name in zip(PIECES, ['king', 'queen', 'rook', 'bishop', 'knight', 'pawn'] * 2)
+}
+
+
+def render_snapshot(fen, orientation='white', board_width=DEFAULT_BOARD_WIDTH, last_move=None):
+    # Обратная операция: минимальная разметка chessground для позиции — для бенчмарков и проверок
+    table = transform_table(board_width / 8, orientation)
+    board = Board.from_placement(fen.split()[0])
+    parts = [
+        f'<html><body><main class="puzzle"><div class="cg-wrap cgv1 orientation-{orientation} manipulable">',
+        f'<cg-container style="width: {board_width:g}px; height: {board_width:g}px;"><cg-board>',
+    ]
+    if last_move:
+        for name in (last_move[:2], last_move[2:4]):
+            parts.append(f'<square class="last-move" style="transform: {table.transform(SQUARE_INDEX[name])};"></square>')
+    for index in range(64):
+        piece = board.get(index)
+        if piece:
+            parts.append(f'<piece class="{PIECE_CLASSES[piece]}" style="transform: {table.transform(index)};"></piece>')
+    parts.append('</cg-board></cg-container></div></main></body></html>\n')
+    return ''.join(parts)
+
+
+def iter_snapshot_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                # Порядок обхода фиксирован — на нём держится продолжение прерванной конвертации
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(('.html', '.htm')):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="FEN из сохранённых HTML-снимков доски chessground")
+    parser.add_argument('paths', nargs='+', help="HTML-файлы или каталоги со снимками")
+    parser.add_argument('--board-width', type=float, default=None,
+                        help="Ширина доски в px, если её нет в разметке (по умолчанию 436)")
+    parser.add_argument('--track', action='store_true',
+                        help="Считать снимки последовательностью одной сессии и вести позицию по ходам")
+    parser.add_argument('--verbose', action='store_true', help="Подробный лог разбора")
+    args = parser.parse_args(argv)
+
+    t_start = time.time()
+    count = 0
+    tracker = PositionTracker() if args.track else None
+    for path in iter_snapshot_paths(args.paths):
+        try:
+            snapshot = read_snapshot(path, args.board_width)
+        except OSError as e:
+            print(f"Ошибка чтения {path}: {e}", file=sys.stderr)
+            continue
+        if snapshot is None:
+            print(f"В {path} не найден cg-board", file=sys.stderr)
+            continue
+        if tracker is not None:
+            fen = tracker.update(snapshot['pieces'], snapshot['last_moves'], snapshot['board_width'] / 8,
+                                 snapshot['orientation'], args.verbose)
+        else:
+            fen = snapshot_to_fen(snapshot, args.verbose)
+        print(f"{fen}\t{path}")
+        count += 1
+    print(f"Обработано снимков: {count}, время: {(time.time() - t_start):.3f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
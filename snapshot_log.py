@@ -0,0 +1,239 @@
+# Компактный журнал снимков доски: записи фиксированного размера вместо HTML страницы.
+# Запись — время, ширина доски, ориентация, клетки last-move и до 32 пар (клетка, фигура).
+# Журнал только дописывается; чтение через mmap, запись i лежит по смещению HEADER + i * RECORD.
+# Реплей идёт прямо в Board/FEN или в PositionTracker, без разбора HTML.
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+from board import Board
+from fen_builder import PIECE_MAP, board_to_fen, clean_class, side_to_move, transform_table
+from metrics import metrics
+from snapshot import PIECE_CLASSES, iter_snapshot_paths, read_snapshot
+from tracker import PositionTracker
+
+MAGIC = b'CGLG'
+VERSION = 1
+MAX_PIECES = 32
+NO_SQUARE = 255
+
+_HEADER = struct.Struct('<4sHH')
+# время (с), ширина доски (px), ориентация (0 — белые, 1 — чёрные), last-move откуда/куда, число фигур, пары
+_RECORD = struct.Struct(f'<dfBBBB{MAX_PIECES * 2}s')
+HEADER_SIZE = _HEADER.size
+RECORD_SIZE = _RECORD.size
+
+_ORIENTATIONS = ('white', 'black')
+
+
+def encode_pieces(pieces, square_size, orientation):
+    # [(клетка, фигура)] из элементов chessground; ghost и неизвестные классы пропускаем.
+    # Две фигуры на одной клетке (анимация) сохраняются обе — как в исходном снимке
+    table = transform_table(square_size, orientation)
+    result = []
+    for piece in pieces:
+        class_name = piece['class']
+        if 'ghost' in class_name:
+            continue
+        letter = PIECE_MAP.get(class_name) or PIECE_MAP.get(clean_class(class_name))
+        index = table.index(piece['transform']) if letter else None
+        if index is not None:
+            result.append((index, letter))
+    return result
+
+
+class SnapshotLog:
+    def __init__(self, path):
+        self.path = path
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.file = open(path, 'ab')
+        if not size:
+            self.file.write(_HEADER.pack(MAGIC, VERSION, RECORD_SIZE))
+            size = HEADER_SIZE
+        else:
+            with open(path, 'rb') as f:
+                _check_header(f.read(HEADER_SIZE), path)
+            # Хвост недописанной записи (падение посреди write) отрезаем
+            size -= (size - HEADER_SIZE) % RECORD_SIZE
+            self.file.truncate(size)
+        self.records = (size - HEADER_SIZE) // RECORD_SIZE
+
+    def append(self, squares, last_squares, board_width, orientation, timestamp=None):
+        # squares: [(клетка, фигура)], last_squares: индексы клеток last-move
+        if len(squares) > MAX_PIECES:
+            metrics.incr('snapshot_log_truncated')
+            squares = squares[:MAX_PIECES]
+        pairs = bytes(byte for index, letter in squares for byte in (index, ord(letter)))
+        last = list(last_squares[:2]) + [NO_SQUARE] * (2 - len(last_squares[:2]))
+        self.file.write(_RECORD.pack(
+            time.time() if timestamp is None else timestamp,
+            board_width,
+            _ORIENTATIONS.index(orientation),
+            last[0], last[1],
+            len(squares),
+            pairs,
+        ))
+        self.file.flush()
+        self.records += 1
+
+    def append_pieces(self, pieces, last_moves, board_width, orientation, timestamp=None):
+        # Прямо из того, что отдаёт page.evaluate или parse_snapshot
+        square_size = board_width / 8
+        table = transform_table(square_size, orientation)
+        last_squares = [index for index in (table.index(t) for t in last_moves) if index is not None]
+        self.append(encode_pieces(pieces, square_size, orientation), last_squares, board_width, orientation, timestamp)
+
+    def append_snapshot(self, snapshot, timestamp=None):
+        self.append_pieces(snapshot['pieces'], snapshot['last_moves'], snapshot['board_width'],
+                           snapshot['orientation'], timestamp)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def _check_header(header, path):
+    if len(header) < HEADER_SIZE:
+        raise ValueError(f"{path}: нет заголовка журнала снимков")
+    magic, version, record_size = _HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"{path}: не журнал снимков или неподдерживаемая версия ({magic!r}, v{version})")
+
+
+class SnapshotLogReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        _check_header(self.file.read(HEADER_SIZE), path)
+        self.count = (size - HEADER_SIZE) // RECORD_SIZE
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        timestamp, board_width, orientation, last_from, last_to, count, pairs = \
+            _RECORD.unpack_from(self.map, HEADER_SIZE + index * RECORD_SIZE)
+        return {
+            'index': index,
+            'timestamp': timestamp,
+            'board_width': board_width,
+            'orientation': _ORIENTATIONS[orientation],
+            'last_squares': [square for square in (last_from, last_to) if square != NO_SQUARE],
+            'squares': [(pairs[i], chr(pairs[i + 1])) for i in range(0, count * 2, 2)],
+        }
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+def record_board(record):
+    board = Board()
+    for index, letter in record['squares']:
+        if not board.put(index, letter):
+            metrics.incr('overlapping_pieces')
+    return board
+
+
+def record_to_fen(record):
+    # То же, что build_fen по снимку, но без transform и классов
+    board = record_board(record)
+    return board_to_fen(board, side_to_move(board, record['last_squares']))
+
+
+def record_to_snapshot(record):
+    # Словарь в формате snapshot.parse_snapshot — для PositionTracker и прочего кода по снимкам
+    table = transform_table(record['board_width'] / 8, record['orientation'])
+    return {
+        'orientation': record['orientation'],
+        'board_width': record['board_width'],
+        'pieces': [{'class': PIECE_CLASSES[letter], 'transform': table.transform(index)}
+                   for index, letter in record['squares']],
+        'last_moves': [table.transform(index) for index in record['last_squares']],
+    }
+
+
+def replay(path, track=False, verbose=False):
+    # Отдаёт (запись, FEN); с track=True позиция ведётся по ходам, как в боте
+    tracker = PositionTracker() if track else None
+    with SnapshotLogReader(path) as reader:
+        for record in reader:
+            if tracker is not None:
+                snapshot = record_to_snapshot(record)
+                fen = tracker.update(snapshot['pieces'], snapshot['last_moves'], snapshot['board_width'] / 8,
+                                     snapshot['orientation'], verbose)
+            else:
+                fen = record_to_fen(record)
+            yield record, fen
+
+
+def convert(paths, output, board_width=None):
+    log = SnapshotLog(output)
+    count = html_bytes = 0
+    try:
+        for path in iter_snapshot_paths(paths):
+            snapshot = read_snapshot(path, board_width)
+            if snapshot is None:
+                print(f"В {path} не найден cg-board", file=sys.stderr)
+                continue
+            log.append_snapshot(snapshot, os.path.getmtime(path))
+            html_bytes += os.path.getsize(path)
+            count += 1
+    finally:
+        log.close()
+    return count, html_bytes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Журнал снимков доски: запись из HTML и реплей в FEN")
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('pack', help="Дописать HTML-снимки в журнал")
+    pack.add_argument('paths', nargs='+', help="HTML-файлы или каталоги со снимками")
+    pack.add_argument('--output', default='snapshots.bin', help="Файл журнала")
+    pack.add_argument('--board-width', type=float, default=None,
+                      help="Ширина доски в px, если её нет в разметке (по умолчанию 436)")
+    play = commands.add_parser('replay', help="Вывести FEN по каждой записи журнала")
+    play.add_argument('log', help="Файл журнала")
+    play.add_argument('--track', action='store_true', help="Вести позицию по ходам через PositionTracker")
+    play.add_argument('--verbose', action='store_true', help="Подробный лог трекера")
+    args = parser.parse_args(argv)
+
+    t_start = time.time()
+    if args.command == 'pack':
+        count, html_bytes = convert(args.paths, args.output, args.board_width)
+        log_bytes = count * RECORD_SIZE
+        print(f"Записано снимков: {count}, HTML {html_bytes} байт -> {log_bytes} байт журнала, "
+              f"время: {(time.time() - t_start):.3f}s", file=sys.stderr)
+    else:
+        count = 0
+        for record, fen in replay(args.log, args.track, args.verbose):
+            print(f"{fen}\t{args.log}:{record['index']}")
+            count += 1
+        print(f"Записей: {count}, время: {(time.time() - t_start):.3f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# Проба локальных таблиц Syzygy (WDL/DTZ) до запуска движка.
+# Таблицы читает python-chess (chess.syzygy, файлы отображаются в память через mmap) —
+# зависимость необязательная: без неё или без таблиц всё считается движком, как раньше.
+# Для позиций с небольшим числом фигур ход выбирается по таблицам мгновенно, результаты
+# проб кэшируются, а доля попаданий попадает в метрики и итоговую статистику прогона.
+import os
+from collections import OrderedDict
+
+from metrics import metrics
+from move_cache import normalize_fen
+
+_MISS = object()
+
+
+def piece_count(fen):
+    return sum(1 for char in fen.split(' ', 1)[0] if char.isalpha())
+
+
+class Tablebase:
+    def __init__(self, paths, max_pieces=None, cache_size=4096):
+        import chess.syzygy
+        self.tables = chess.syzygy.Tablebase()
+        for path in paths:
+            self.tables.add_directory(path)
+        # Фигур в самой большой таблице: по именам файлов вида KQvKR.rtbw
+        largest = max((len(name) - 1 for name in self.tables.wdl), default=0)
+        self.max_pieces = min(max_pieces or largest, largest)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.requests = 0
+        self.probes = 0
+        self.hits = 0
+        self.cache_hits = 0
+
+    def _best_move(self, board):
+        # Выигрыш: сначала мат, потом ход, обнуляющий счётчик 50 ходов, потом кратчайший DTZ.
+        # Проигрыш: максимально длинный DTZ. Ничья — любой ничейный ход
+        best_key = best = None
+        for move in board.legal_moves:
+            zeroing = board.is_zeroing(move)
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    wdl, dtz = 2, 1
+                    key = (3, 0, 0)
+                else:
+                    wdl = -self.tables.probe_wdl(board)
+                    dtz = -self.tables.probe_dtz(board)
+                    key = (wdl, int(zeroing), -abs(dtz)) if wdl > 0 else (wdl, 0, abs(dtz))
+            finally:
+                board.pop()
+            if best_key is None or key > best_key:
+                best_key = key
+                best = {'move': move.uci(), 'wdl': wdl, 'dtz': dtz}
+        return best
+
+    def _probe(self, fen):
+        import chess
+        board = chess.Board(fen)
+        # В таблицах нет позиций с правом рокировки
+        if board.castling_rights:
+            return None
+        try:
+            return self._best_move(board)
+        except KeyError:
+            # MissingTableError — наследник KeyError: нужной таблицы нет на диске
+            return None
+
+    def probe(self, fen):
+        # {'move', 'wdl', 'dtz'} или None, если позиции нет в таблицах
+        self.requests += 1
+        if piece_count(fen) > self.max_pieces:
+            return None
+        self.probes += 1
+        key = normalize_fen(fen)
+        result = self.cache.get(key, _MISS)
+        if result is _MISS:
+            with metrics.span('tablebase_probe'):
+                result = self._probe(fen)
+            self.cache[key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+            self.cache_hits += 1
+        if result is None:
+            metrics.incr('tablebase_misses')
+            return None
+        self.hits += 1
+        metrics.incr('tablebase_hits')
+        return dict(result)
+
+    def stats(self):
+        return {
+            'max_pieces': self.max_pieces,
+            'positions': self.requests,
+            'probes': self.probes,
+            'hits': self.hits,
+            'cache_hits': self.cache_hits,
+            'hit_rate': round(self.hits / self.requests, 4) if self.requests else 0.0,
+        }
+
+    def close(self):
+        self.tables.close()
+
+
+def open_tablebase(paths, max_pieces=None):
+    # paths — строка с каталогами через os.pathsep или список; None, если пробовать нечего
+    if not paths:
+        return None
+    if isinstance(paths, str):
+        paths = [path for path in paths.split(os.pathsep) if path]
+    # python-chess грузится только если таблицы заданы
+    try:
+        import chess.syzygy
+    except ImportError:
+        print("Для таблиц Syzygy нужен python-chess (pip install chess), считаем движком")
+        return None
+    tablebase = Tablebase(paths, max_pieces)
+    if not tablebase.max_pieces:
+        print(f"В {os.pathsep.join(paths)} не найдено таблиц Syzygy, считаем движком")
+        tablebase.close()
+        return None
+    print(f"Таблицы Syzygy: до {tablebase.max_pieces} фигур из {os.pathsep.join(paths)}")
+    return tablebase
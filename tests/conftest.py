@@ -0,0 +1,5 @@
+# Модули лежат в корне репозитория — добавляем его в sys.path для тестов
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
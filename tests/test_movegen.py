@@ -0,0 +1,65 @@
+import pytest
+
+from board import Position
+from movegen import legal_moves, perft, validate_fen
+
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+# Взятие на проходе и связки по горизонтали
+EN_PASSANT = '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1'
+# Превращения со взятием и без, рокировка под ударом
+PROMOTION = 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1'
+
+
+@pytest.mark.parametrize('fen, counts', [
+    (START, [20, 400, 8902]),
+    (KIWIPETE, [48, 2039, 97862]),
+    (EN_PASSANT, [14, 191, 2812, 43238]),
+    (PROMOTION, [6, 264, 9467]),
+])
+def test_perft(fen, counts):
+    position = Position.from_fen(fen)
+    for depth, expected in enumerate(counts, 1):
+        assert perft(position, depth) == expected
+
+
+def test_en_passant_capture_is_generated():
+    position = Position.from_fen('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2')
+    assert 'e5d6' in legal_moves(position)
+
+
+def test_promotion_moves():
+    position = Position.from_fen('7k/P7/8/8/8/8/8/K7 w - - 0 1')
+    assert {move for move in legal_moves(position) if move.startswith('a7')} == {'a7a8q', 'a7a8r', 'a7a8b', 'a7a8n'}
+
+
+def test_valid_fens():
+    for fen in (START, KIWIPETE, EN_PASSANT, PROMOTION):
+        assert validate_fen(fen) == (True, None)
+
+
+@pytest.mark.parametrize('fen, reason', [
+    # Два белых короля
+    ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKKNR w - - 0 1', "должен быть ровно один король K"),
+    ('8/8/8/8/8/8/8/4K3 w - - 0 1', "должен быть ровно один король k"),
+    # Ходят белые, а под шахом чёрный король
+    ('4k3/8/8/8/8/8/8/4R1K1 w - - 0 1', "сторона, которая не ходит, под шахом"),
+    # Пешка на первой и на последней горизонтали
+    ('4k3/8/8/8/8/8/8/P3K3 w - - 0 1', "пешка на крайней горизонтали a1"),
+    ('p3k3/8/8/8/8/8/8/4K3 b - - 0 1', "пешка на крайней горизонтали a8"),
+    ('4k3/8/8/8/8/8/8/4K3 w - e6 0 1', "невозможное поле взятия на проходе e6"),
+])
+def test_rejected_positions(fen, reason):
+    assert validate_fen(fen) == (False, reason)
+
+
+@pytest.mark.parametrize('fen', [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBN1 w KQkq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq',
+])
+def test_malformed_fens(fen):
+    ok, reason = validate_fen(fen)
+    assert not ok
+    assert reason
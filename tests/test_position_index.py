@@ -0,0 +1,129 @@
+import argparse
+import random
+
+import pytest
+
+import corpus
+from board import Position
+from move_cache import normalize_fen
+from movegen import legal_moves
+from position_index import PositionIndex, find, open_index
+from snapshot import render_snapshot
+
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def random_game(count, seed=7):
+    rng = random.Random(seed)
+    position = Position.from_fen(START)
+    result = []
+    while len(result) < count:
+        moves = legal_moves(position)
+        if not moves:
+            position = Position.from_fen(START)
+            continue
+        move = rng.choice(moves)
+        position.push_uci(move)
+        result.append((position.fen(), move))
+    return result
+
+
+def write_snapshots(directory, count):
+    directory.mkdir()
+    games = random_game(count)
+    for number, (fen, move) in enumerate(games):
+        (directory / f"{number:03d}.html").write_text(render_snapshot(fen, last_move=move), encoding='utf-8')
+    # Повторы уже записанных позиций
+    for number, (fen, move) in enumerate(games[:count // 4]):
+        (directory / f"{count + number:03d}.html").write_text(render_snapshot(fen, last_move=move), encoding='utf-8')
+    return games
+
+
+def corpus_args(tmp_path, snapshots):
+    return argparse.Namespace(paths=[str(snapshots)], output=str(tmp_path / 'corpus.tsv'),
+                              checkpoint=str(tmp_path / 'corpus.ckpt'), workers=1, batch=4, board_width=None)
+
+
+def read_corpus(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.split('\t', 1)[0] for line in f]
+
+
+def test_resume_after_interrupted_batch(tmp_path, monkeypatch):
+    snapshots = tmp_path / 'snapshots'
+    write_snapshots(snapshots, 40)
+    args = corpus_args(tmp_path, snapshots)
+    expected = {normalize_fen(fen) for fen, _, _ in corpus.convert_batch(sorted(map(str, snapshots.iterdir())))}
+
+    real_find = corpus.find
+    calls = 0
+
+    def interrupted(*find_args):
+        # Обрыв посреди пачки: часть её позиций уже в индексе, а в чекпоинте их ещё нет
+        nonlocal calls
+        calls += 1
+        if calls == 10:
+            raise KeyboardInterrupt
+        return real_find(*find_args)
+
+    monkeypatch.setattr(corpus, 'find', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        corpus.run(args)
+    monkeypatch.setattr(corpus, 'find', real_find)
+
+    state = corpus.run(args)
+    fens = read_corpus(args.output)
+    assert len(fens) == len(expected) == state['written']
+    assert {normalize_fen(fen) for fen in fens} == expected
+
+
+def test_changed_file_set_leaves_corpus_untouched(tmp_path, monkeypatch):
+    snapshots = tmp_path / 'snapshots'
+    write_snapshots(snapshots, 12)
+    args = corpus_args(tmp_path, snapshots)
+    corpus.run(args)
+    with open(args.output, 'ab') as f:
+        f.write(b'tail')
+    before = (tmp_path / 'corpus.tsv').read_bytes()
+
+    for path in sorted(snapshots.iterdir())[:3]:
+        path.unlink()
+
+    def unexpected(*open_args):
+        raise AssertionError("индекс не должен открываться")
+
+    monkeypatch.setattr(corpus, 'open_index', unexpected)
+    corpus.run(args)
+    assert (tmp_path / 'corpus.tsv').read_bytes() == before
+
+
+def test_hash_collision_keeps_both_positions(tmp_path):
+    corpus_path = tmp_path / 'corpus.tsv'
+    first = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1'
+    second = 'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2'
+    corpus_path.write_bytes(f"{first}\ta\n".encode())
+    index = open_index(str(corpus_path))
+    try:
+        # Один и тот же ключ для разных позиций
+        index.add(42, 0)
+        with open(corpus_path, 'rb') as f:
+            assert find(index, f, first, 42) == f"{first}\ta"
+            assert find(index, f, second, 42) is None
+    finally:
+        index.close()
+
+
+def test_uncommitted_index_is_rebuilt(tmp_path):
+    corpus_path = tmp_path / 'corpus.tsv'
+    corpus_path.write_bytes(b'')
+    index = open_index(str(corpus_path))
+    index.add(7, 0)
+    index.close()
+    stale = PositionIndex(str(tmp_path / 'corpus.tsv.idx'))
+    assert stale.data_size != 0
+    stale.close()
+    index = open_index(str(corpus_path))
+    try:
+        assert len(index) == 0
+    finally:
+        index.close()
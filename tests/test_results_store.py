@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from results_store import ResultStore
+
+np = pytest.importorskip('numpy')
+
+
+def row(index, correct, rating=1500):
+    return {'hash': index + 1, 'move': 'e2e4', 'score': 30, 'mate': None, 'depth': 12,
+            'time': 0.1 * (index + 1), 'correct': correct, 'rating': rating}
+
+
+def file_sizes(path):
+    return {name: os.path.getsize(os.path.join(path, name)) for name in sorted(os.listdir(path))}
+
+
+def test_query_during_flush_is_read_only(tmp_path):
+    path = str(tmp_path / 'store')
+    writer = ResultStore(path)
+    writer.truncate(0)
+    for index in range(3):
+        writer.append(row(index, index != 1), ['fork'])
+    assert writer.flush() == 3
+
+    # Пишущий дописал колонки и индексы, но meta.json ещё не обновил
+    for index in range(3, 5):
+        writer.append(row(index, True, rating=2100), ['fork', 'pin'])
+    for name, values in writer.pending.items():
+        with open(os.path.join(path, name + '.col'), 'ab') as f:
+            values.tofile(f)
+    for key, rows in writer.pending_postings.items():
+        with open(os.path.join(path, key + '.rows'), 'ab') as f:
+            rows.tofile(f)
+    before = file_sizes(path)
+
+    reader = ResultStore(path)
+    assert reader.by_theme()['fork'] == {'positions': 3, 'accuracy': round(2 / 3, 4), 'median_time': 0.2}
+    assert 'pin' not in reader.by_theme()
+    assert reader.by_band() == {1400: {'positions': 3, 'accuracy': round(2 / 3, 4), 'median_time': 0.2},
+                                2000: {'positions': 0, 'accuracy': 0.0, 'median_time': None}}
+    assert len(reader.rows('fork', 1500)) == 3
+    assert file_sizes(path) == before
+
+
+def test_writer_truncates_uncommitted_tail(tmp_path):
+    path = str(tmp_path / 'store')
+    writer = ResultStore(path)
+    for index in range(4):
+        writer.append(row(index, True), ['fork'])
+    writer.flush()
+    writer.append(row(4, False), ['fork'])
+    writer.flush()
+
+    resumed = ResultStore(path)
+    resumed.truncate(4)
+    assert len(resumed) == 4
+    assert resumed.by_theme()['fork']['positions'] == 4
+    assert os.path.getsize(os.path.join(path, 'correct.col')) == 4
+
+
+def test_missing_store_is_not_created(tmp_path):
+    path = str(tmp_path / 'missing')
+    store = ResultStore(path)
+    assert len(store) == 0 and store.by_band() == {}
+    assert not os.path.exists(path)
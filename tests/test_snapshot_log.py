@@ -0,0 +1,81 @@
+import os
+
+from board import Position
+from snapshot import parse_snapshot, render_snapshot
+from snapshot_log import HEADER_SIZE, RECORD_SIZE, SnapshotLog, SnapshotLogReader, replay
+
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# Двойной ход пешки рядом с пешкой соперника (поле взятия на проходе), само взятие,
+# рокировки обеих сторон и потеря прав после хода ладьи
+MOVES = ['e2e4', 'g8f6', 'e4e5', 'd7d5', 'e5d6', 'e7d6', 'g1f3', 'f8e7', 'f1e2', 'e8g8', 'h1g1', 'b8c6', 'g1h1']
+
+
+def game_positions():
+    position = Position.from_fen(START)
+    result = []
+    for move in MOVES:
+        position.push_uci(move)
+        result.append((position.fen(), move))
+    return result
+
+
+def write_log(path, positions, alternate=False):
+    # alternate — ориентация меняется на каждой записи (трекер на смене ориентации пересинхронизируется)
+    log = SnapshotLog(str(path))
+    for number, (fen, move) in enumerate(positions):
+        orientation = 'black' if alternate and number % 2 else 'white'
+        log.append_snapshot(parse_snapshot(render_snapshot(fen, orientation, last_move=move)), timestamp=number)
+    log.close()
+
+
+def test_record_size(tmp_path):
+    path = tmp_path / 'snapshots.bin'
+    positions = game_positions()
+    write_log(path, positions)
+    assert RECORD_SIZE == 80
+    assert os.path.getsize(path) == HEADER_SIZE + len(positions) * RECORD_SIZE
+
+
+def test_replay_round_trip(tmp_path):
+    path = tmp_path / 'snapshots.bin'
+    positions = game_positions()
+    write_log(path, positions)
+    black = tmp_path / 'black.bin'
+    write_log(black, positions, alternate=True)
+    assert [fen for _, fen in replay(str(black))] == [fen for _, fen in replay(str(path))]
+    # Без трекера: расстановка и очередь хода по last-move; рокировки — по местам королей и ладей,
+    # поэтому ушедшая и вернувшаяся ладья (h1g1, g1h1) видна только трекеру
+    replayed = [fen for _, fen in replay(str(path))]
+    assert [fen.split()[:2] for fen in replayed] == [fen.split()[:2] for fen, _ in positions]
+    rook_moved = MOVES.index('h1g1')
+    assert [fen.split()[2] for fen in replayed[:rook_moved]] == [fen.split()[2] for fen, _ in positions[:rook_moved]]
+    # С трекером позиция ведётся по ходам — совпадает и поле взятия на проходе
+    tracked = [fen for _, fen in replay(str(path), track=True)]
+    assert [fen.split()[:4] for fen in tracked] == [fen.split()[:4] for fen, _ in positions]
+    assert {fen.split()[1] for fen, _ in positions} == {'w', 'b'}
+    assert any(fen.split()[3] != '-' for fen, _ in positions)
+
+
+def test_records_keep_metadata(tmp_path):
+    path = tmp_path / 'snapshots.bin'
+    positions = game_positions()
+    write_log(path, positions, alternate=True)
+    with SnapshotLogReader(str(path)) as reader:
+        assert len(reader) == len(positions)
+        for number, record in enumerate(reader):
+            assert record['timestamp'] == number
+            assert record['orientation'] == ('black' if number % 2 else 'white')
+            assert record['board_width'] == 436.0
+            assert len(record['last_squares']) == 2
+
+
+def test_partial_record_is_dropped(tmp_path):
+    path = tmp_path / 'snapshots.bin'
+    positions = game_positions()
+    write_log(path, positions)
+    with open(path, 'ab') as f:
+        f.write(b'\0' * (RECORD_SIZE // 2))
+    log = SnapshotLog(str(path))
+    assert log.records == len(positions)
+    log.close()
+    assert os.path.getsize(path) == HEADER_SIZE + len(positions) * RECORD_SIZE
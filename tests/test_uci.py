@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from uci import Search, parse_info
+
+
+def test_parse_info():
+    info = parse_info('info depth 20 seldepth 28 multipv 1 score cp 35 nodes 1200 pv e2e4 e7e5')
+    assert info['depth'] == 20 and info['score'] == 35 and info['mate'] is None
+    assert info['pv'] == ['e2e4', 'e7e5']
+    info = parse_info('info depth 9 score mate -3 upperbound pv h7h8')
+    assert info['mate'] == -3 and info['bound'] == 'upperbound'
+
+
+@pytest.mark.parametrize('line', [
+    'info depth 12 score cp 3x5 pv e2e4',
+    'info depth 12 score mate pv e2e4',
+    'info depth 12 score cp - pv e2e4',
+])
+def test_malformed_score(line):
+    assert parse_info(line) is None
+
+
+class FakeEngine:
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.search = None
+
+    async def read_line(self):
+        return next(self.lines)
+
+
+def test_search_skips_malformed_lines():
+    engine = FakeEngine([
+        'info depth 1 score cp 20 pv e2e4',
+        'info depth 2 score cp 2?0 pv d2d4',
+        'info depth 3 score cp 25 pv e2e4 e7e5',
+        'bestmove e2e4 ponder e7e5',
+    ])
+    result = asyncio.run(Search(engine, 'startpos', 'go depth 3').wait())
+    assert result['move'] == 'e2e4' and result['ponder'] == 'e7e5'
+    assert result['depth'] == 3 and result['score'] == 25
@@ -0,0 +1,126 @@
+# Инкрементальное отслеживание позиции по последовательным снимкам доски.
+# Вместо полного разбора на каждом шаге сравниваются множества (фигура, transform):
+# если разница объясняется одним ходом, он применяется к Position, и очередь хода,
+# рокировки и взятие на проходе берутся из истории ходов, а не из эвристик.
+# Всё, что одним ходом не объясняется (новая задача, пропущенные ходы), — полная пересинхронизация.
+from board import Position, SQUARE_NAMES
+from fen_builder import PIECE_MAP, build_board, clean_class, last_move_squares, side_to_move, transform_table
+from metrics import metrics
+
+
+def piece_set(pieces):
+    result = set()
+    for piece in pieces:
+        class_name = piece['class']
+        if 'ghost' in class_name or not piece.get('transform'):
+            continue
+        letter = PIECE_MAP.get(class_name) or PIECE_MAP.get(clean_class(class_name))
+        if letter:
+            result.add((letter, piece['transform']))
+    return frozenset(result)
+
+
+def infer_move(removed, added):
+    # removed/added: [(клетка, фигура)]; возвращает ход в UCI или None
+    colors = {letter.isupper() for _, letter in added}
+    if len(colors) != 1:
+        return None
+    white = colors.pop()
+    own_removed = [(square, letter) for square, letter in removed if letter.isupper() == white]
+
+    if len(added) == 2:
+        # Рокировка: появились король и ладья своего цвета
+        kings_to = [square for square, letter in added if letter in 'Kk']
+        kings_from = [square for square, letter in own_removed if letter in 'Kk']
+        if len(kings_to) == 1 and len(kings_from) == 1 and len(own_removed) == 2:
+            return SQUARE_NAMES[kings_from[0]] + SQUARE_NAMES[kings_to[0]]
+        return None
+
+    if len(added) != 1 or len(own_removed) != 1:
+        return None
+    target, letter = added[0]
+    source, moved = own_removed[0]
+    promotion = ''
+    if moved != letter:
+        if moved not in 'Pp' or letter in 'PpKk':
+            return None
+        promotion = letter.lower()
+    return SQUARE_NAMES[source] + SQUARE_NAMES[target] + promotion
+
+
+class PositionTracker:
+    def __init__(self):
+        self.position = None
+        self.pieces = frozenset()
+        self.layout = None
+        self.fen = None
+        self.moves = []
+        self.resyncs = 0
+
+    def reset(self):
+        self.__init__()
+
+    def _resync(self, pieces, last_moves, square_size, orientation, verbose):
+        board = build_board(pieces, square_size, orientation, verbose)
+        turn = side_to_move(board, last_move_squares(last_moves, square_size, orientation), verbose)
+        self.position = Position(board, turn, board.castling_rights())
+        self.moves = []
+        self.resyncs += 1
+        metrics.incr('tracker_resyncs')
+
+    def _apply_diff(self, removed, added, table):
+        removed = [(table.index(transform), letter) for letter, transform in removed]
+        added = [(table.index(transform), letter) for letter, transform in added]
+        if any(square is None for square, _ in removed + added):
+            return None
+        move = infer_move(removed, added)
+        if move is None:
+            return None
+
+        # Ожидаемое содержимое изменившихся клеток по новому снимку
+        expected = {square: None for square, _ in removed}
+        expected.update({square: letter for square, letter in added})
+        board = self.position.board
+        position = self.position.copy()
+        try:
+            touched = position.push_uci(move)
+        except (ValueError, KeyError):
+            return None
+        # Клетки, которые ход задел, а снимок не изменил, должны остаться как были
+        for square in touched:
+            expected.setdefault(square, board.get(square))
+        for square, letter in expected.items():
+            if position.board.get(square) != letter:
+                return None
+        self.position = position
+        return move
+
+    def update(self, pieces, last_moves, square_size, orientation, verbose=False):
+        current = piece_set(pieces)
+        layout = (square_size, orientation)
+        if self.position is not None and layout == self.layout:
+            if current == self.pieces:
+                return self.fen
+            table = transform_table(square_size, orientation)
+            move = self._apply_diff(self.pieces - current, current - self.pieces, table)
+            if move is not None:
+                self.moves.append(move)
+                metrics.incr('tracker_moves')
+                if verbose:
+                    print(f"Трекер: ход {move}")
+            else:
+                self._resync(pieces, last_moves, square_size, orientation, verbose)
+        else:
+            self._resync(pieces, last_moves, square_size, orientation, verbose)
+        self.pieces = current
+        self.layout = layout
+        self.fen = self.position.fen()
+        return self.fen
+
+
+def replay(snapshots, verbose=False):
+    # Прогон записанной последовательности снимков (словари snapshot.parse_snapshot) -> FEN
+    tracker = PositionTracker()
+    for snapshot in snapshots:
+        yield tracker.update(snapshot['pieces'], snapshot['last_moves'], snapshot['board_width'] / 8,
+                             snapshot['orientation'], verbose)
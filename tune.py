@@ -0,0 +1,147 @@
+# Подбор конфигурации движка: Threads, Hash, число процессов и время на ход.
+# Каждая комбинация прогоняется по выборке задач lichess (первая позиция решения и ожидаемый ход),
+# меряются позиции в секунду и точность. Лучшая по числу решений в секунду — среди тех,
+# чья точность не хуже лучшей больше чем на --max-accuracy-drop, — пишется в settings.json.
+import argparse
+import itertools
+import json
+import os
+import time
+
+from board import Position
+from readers import iter_puzzles
+from settings import CONFIG_PATH, SETTING, save_config
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',') if value]
+
+
+def load_sample(path, limit):
+    # (FEN после хода соперника, ожидаемый ход)
+    sample = []
+    for puzzle, _ in iter_puzzles(path):
+        moves = puzzle['Moves'].split()
+        if len(moves) < 2:
+            continue
+        try:
+            position = Position.from_fen(puzzle['FEN'])
+            position.push_uci(moves[0])
+        except (ValueError, KeyError) as e:
+            print(f"Пропускаем задачу {puzzle['PuzzleId']}: {e}")
+            continue
+        sample.append((position.fen(), moves[1]))
+        if len(sample) >= limit:
+            break
+    return sample
+
+
+def iter_configs(args):
+    cpu_count = os.cpu_count() or 1
+    for threads, hash_size, engines, think_time in itertools.product(
+            args.threads, args.hash, args.engines, args.think_times):
+        # Больше потоков, чем ядер, — замер о конкуренции за CPU, а не о движке
+        if threads * engines > cpu_count and not args.oversubscribe:
+            continue
+        yield {'threads': threads, 'hash_size': hash_size, 'engines': engines, 'thinking_time': think_time}
+
+
+async def measure(config, sample):
+    import asyncio
+    from uci import open_engine
+    engines = [await open_engine(threads=config['threads'], hash_size=config['hash_size'])
+               for _ in range(config['engines'])]
+    positions = iter(sample)
+    solved = 0
+
+    async def worker(engine):
+        nonlocal solved
+        for fen, expected in positions:
+            result = await engine.analyse(fen, movetime=config['thinking_time'])
+            solved += result['move'] == expected
+
+    try:
+        for engine in engines:
+            await engine.new_game()
+        t_start = time.perf_counter()
+        await asyncio.gather(*(worker(engine) for engine in engines))
+        elapsed = time.perf_counter() - t_start
+    finally:
+        for engine in engines:
+            await engine.quit()
+    return dict(
+        config,
+        positions=len(sample),
+        accuracy=round(solved / len(sample), 4),
+        positions_per_second=round(len(sample) / elapsed, 3),
+        solved_per_second=round(solved / elapsed, 3),
+        elapsed=round(elapsed, 2),
+    )
+
+
+def pick_best(results, max_accuracy_drop):
+    best_accuracy = max(result['accuracy'] for result in results)
+    eligible = [result for result in results if result['accuracy'] >= best_accuracy - max_accuracy_drop]
+    return max(eligible, key=lambda result: (result['solved_per_second'], result['accuracy']))
+
+
+async def run(args):
+    sample = load_sample(args.csv, args.limit)
+    if not sample:
+        print("Выборка пуста")
+        return None
+    configs = list(iter_configs(args))
+    if not configs:
+        print(f"Нет подходящих комбинаций при {os.cpu_count()} ядрах (см. --oversubscribe)")
+        return None
+    estimate = sum(len(sample) * config['thinking_time'] / config['engines'] for config in configs) / 1000
+    print(f"Позиций: {len(sample)}, комбинаций: {len(configs)}, примерно {estimate:.0f}s")
+
+    results = []
+    for config in configs:
+        result = await measure(config, sample)
+        results.append(result)
+        print(f"Threads {result['threads']}, Hash {result['hash_size']}, процессов {result['engines']}, "
+              f"{result['thinking_time']} мс: {result['positions_per_second']} поз/с, "
+              f"точность {result['accuracy']:.1%}, решений/с {result['solved_per_second']}")
+
+    best = pick_best(results, args.max_accuracy_drop)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'best': best, 'results': results, 'cpu_count': os.cpu_count()}, f, ensure_ascii=False, indent=2)
+    print(f"Лучшая конфигурация: {best}")
+    if not args.dry_run:
+        save_config({
+            'threads': best['threads'],
+            'hash_size': best['hash_size'],
+            'engines': best['engines'],
+            'thinking_time': best['thinking_time'],
+            '_tuned': {'at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'sample': args.csv, 'positions': len(sample),
+                       'accuracy': best['accuracy'], 'solved_per_second': best['solved_per_second']},
+        }, args.config)
+        print(f"Записано в {args.config}")
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Подбор Threads/Hash/числа процессов/времени на ход по выборке задач")
+    parser.add_argument('csv', help="Путь к lichess_db_puzzle.csv")
+    parser.add_argument('--limit', type=int, default=200, help="Размер выборки позиций")
+    parser.add_argument('--threads', type=_int_list, default=[1, 2, 4, 8], help="Значения Threads через запятую")
+    parser.add_argument('--hash', type=_int_list, default=[SETTING.hash_size], help="Значения Hash (МБ) через запятую")
+    parser.add_argument('--engines', type=_int_list, default=[1, 2, 4, 8], help="Число процессов через запятую")
+    parser.add_argument('--think-times', type=_int_list, default=[SETTING.thinking_time],
+                        help="Время на ход (мс) через запятую")
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.02,
+                        help="Насколько точность может уступать лучшей ради скорости")
+    parser.add_argument('--oversubscribe', action='store_true', help="Пробовать Threads * процессов больше числа ядер")
+    parser.add_argument('--output', default='tune_results.json', help="Все замеры (JSON)")
+    parser.add_argument('--config', default=CONFIG_PATH, help="Куда записать лучшую конфигурацию")
+    parser.add_argument('--dry-run', action='store_true', help="Только замеры, настройки не менять")
+    args = parser.parse_args(argv)
+    # asyncio и UCI-клиент импортируются только для прогона — --help и импорт модуля их не ждут
+    import asyncio
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
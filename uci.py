@@ -0,0 +1,264 @@
+# Разбор вывода UCI-движка и асинхронный клиент для офлайн-анализа.
+import argparse
+import asyncio
+import time
+
+from settings import SETTING, stockfish_path
+
+_INT_FIELDS = ('depth', 'seldepth', 'multipv', 'nodes', 'nps', 'time', 'hashfull', 'tbhits')
+
+
+def parse_info(line):
+    # 'info depth 20 ... score cp 35 ... pv e2e4 e7e5' -> {'depth': 20, 'score': 35, 'mate': None, 'pv': [...]}
+    # None — не строка info или строка с испорченной оценкой
+    tokens = line.split()
+    if not tokens or tokens[0] != 'info':
+        return None
+    info = {'score': None, 'mate': None, 'pv': []}
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token in _INT_FIELDS and i + 1 < len(tokens):
+            try:
+                info[token] = int(tokens[i + 1])
+            except ValueError:
+                pass
+            i += 2
+        elif token == 'score' and i + 2 < len(tokens):
+            kind = tokens[i + 1]
+            try:
+                value = int(tokens[i + 2])
+            except ValueError:
+                # Обрезанная или испорченная строка: оценке в ней верить нельзя, пропускаем строку целиком
+                return None
+            if kind == 'cp':
+                info['score'] = value
+            elif kind == 'mate':
+                info['mate'] = value
+            i += 3
+            if i < len(tokens) and tokens[i] in ('lowerbound', 'upperbound'):
+                info['bound'] = tokens[i]
+                i += 1
+        elif token == 'pv':
+            info['pv'] = tokens[i + 1:]
+            break
+        elif token == 'string':
+            info['string'] = ' '.join(tokens[i + 1:])
+            break
+        else:
+            i += 1
+    return info
+
+
+# Асинхронный UCI-клиент поверх asyncio.create_subprocess_exec.
+# В отличие от python-stockfish не блокирует event loop, отдаёт строки info по мере поиска,
+# поиск можно прервать командой stop и запускать в режиме ponder.
+class Search:
+    def __init__(self, engine, fen, command):
+        self.engine = engine
+        self.fen = fen
+        self.command = command
+        self.info = {}
+        self.lines = {}
+        self.bestmove = None
+        self.ponder = None
+        self.done = False
+        self.stopped = False
+        self.t_start = time.perf_counter()
+        self.elapsed = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # Следующая строка info с оценкой и вариантом; StopAsyncIteration после bestmove
+        while not self.done:
+            text = await self.engine.read_line()
+            if text.startswith('bestmove'):
+                self._finish(text)
+                break
+            info = parse_info(text)
+            if info and info['pv']:
+                # Строки с границей (lowerbound/upperbound) — промежуточные, последней оценкой не считаем
+                if 'bound' not in info:
+                    self.info = info
+                    self.lines[info.get('multipv', 1)] = info
+                return info
+        raise StopAsyncIteration
+
+    def _finish(self, text):
+        tokens = text.split()
+        self.bestmove = tokens[1] if len(tokens) > 1 and tokens[1] != '(none)' else None
+        self.ponder = tokens[3] if len(tokens) > 3 and tokens[2] == 'ponder' else None
+        self.done = True
+        self.elapsed = time.perf_counter() - self.t_start
+        self.engine.search = None
+
+    async def wait(self):
+        async for _ in self:
+            pass
+        return self.result()
+
+    async def stop(self):
+        # Досрочная остановка: движок всё равно отвечает bestmove, его и дожидаемся
+        if not self.done:
+            self.stopped = True
+            await self.engine.send('stop')
+        return await self.wait()
+
+    async def ponderhit(self):
+        # Соперник сыграл ожидаемый ход — поиск продолжается уже как обычный
+        if not self.done:
+            await self.engine.send('ponderhit')
+
+    def result(self):
+        return {
+            'fen': self.fen,
+            'move': self.bestmove,
+            'ponder': self.ponder,
+            'score': self.info.get('score'),
+            'mate': self.info.get('mate'),
+            'depth': self.info.get('depth'),
+            'pv': ' '.join(self.info.get('pv', [])),
+            'time': self.elapsed if self.elapsed is not None else time.perf_counter() - self.t_start,
+            'stopped': self.stopped,
+        }
+
+
+class UciEngine:
+    def __init__(self, path=None, options=None, timeout=10):
+        self.path = path
+        self.options = options or {}
+        self.timeout = timeout
+        self.process = None
+        self.name = None
+        self.search = None
+        self._lock = None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            self.path, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self._lock = asyncio.Lock()
+        await self.send('uci')
+        while True:
+            text = await asyncio.wait_for(self.read_line(), self.timeout)
+            if text.startswith('id name '):
+                self.name = text[8:]
+            elif text == 'uciok':
+                break
+        for name, value in self.options.items():
+            await self.set_option(name, value)
+        await self.is_ready()
+        return self
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.quit()
+        return False
+
+    async def send(self, command):
+        self.process.stdin.write((command + '\n').encode())
+        await self.process.stdin.drain()
+
+    async def read_line(self):
+        line = await self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"UCI-движок {self.name or self.path} завершился")
+        return line.decode().strip()
+
+    async def is_ready(self):
+        await self.send('isready')
+        while await asyncio.wait_for(self.read_line(), self.timeout) != 'readyok':
+            pass
+
+    async def set_option(self, name, value):
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        self.options[name] = value
+        await self.send(f"setoption name {name} value {value}")
+
+    async def new_game(self):
+        await self.send('ucinewgame')
+        await self.is_ready()
+
+    async def go(self, fen, movetime=None, depth=None, nodes=None, moves=None, ponder=False):
+        # Запускает поиск и сразу возвращает Search; строки info читаются по мере итерации.
+        # Прошлый поиск, если его не дочитали, останавливаем
+        if self.search is not None:
+            await self.search.stop()
+        position = f"position fen {fen}" + (f" moves {' '.join(moves)}" if moves else '')
+        command = 'go'
+        if ponder:
+            command += ' ponder'
+        if depth:
+            command += f" depth {depth}"
+        if nodes:
+            command += f" nodes {nodes}"
+        if movetime:
+            command += f" movetime {movetime}"
+        if command in ('go', 'go ponder'):
+            command += ' infinite'
+        await self.send(position)
+        await self.send(command)
+        self.search = Search(self, fen, command)
+        return self.search
+
+    async def analyse(self, fen, movetime=None, depth=None, nodes=None):
+        # Весь поиск целиком; параллельные вызовы на одном движке идут по очереди
+        async with self._lock:
+            search = await self.go(fen, movetime, depth, nodes)
+            return await search.wait()
+
+    async def quit(self):
+        if self.process is None:
+            return
+        try:
+            if self.search is not None:
+                await self.search.stop()
+            await self.send('quit')
+            await asyncio.wait_for(self.process.wait(), self.timeout)
+        except (RuntimeError, ConnectionError, asyncio.TimeoutError):
+            self.process.kill()
+        self.process = None
+
+
+async def open_engine(path=None, threads=None, hash_size=None, options=None):
+    # Движок с настройками из SETTING, как у EngineWorker
+    engine_options = {
+        'Threads': threads or SETTING.threads,
+        'Hash': hash_size or SETTING.hash_size,
+    }
+    engine_options.update(options or {})
+    return await UciEngine(path or stockfish_path(), engine_options).start()
+
+
+async def _main(args):
+    engine = await open_engine(threads=args.threads)
+    try:
+        search = await engine.go(args.fen, movetime=args.movetime, depth=args.depth)
+        async for info in search:
+            score = f"#{info['mate']}" if info['mate'] is not None else info['score']
+            print(f"depth {info.get('depth')} score {score} pv {' '.join(info['pv'][:8])}")
+        print(f"bestmove {search.bestmove} ({search.elapsed:.3f}s)")
+    finally:
+        await engine.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Поиск по позиции с выводом промежуточных строк info")
+    parser.add_argument('fen', help="Позиция в FEN")
+    parser.add_argument('--movetime', type=int, default=None, help="Время поиска, мс")
+    parser.add_argument('--depth', type=int, default=None, help="Глубина поиска")
+    parser.add_argument('--threads', type=int, default=None, help="Потоков Stockfish")
+    args = parser.parse_args(argv)
+    if not args.movetime and not args.depth:
+        args.movetime = 1000
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()